@@ -1,18 +1,26 @@
 from __future__ import annotations
 
+import asyncio
 import copy
 import os
 import pathlib
-from functools import lru_cache
-from typing import Any, Optional
+from typing import Any, Awaitable, Callable, Optional, Union
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
 
+import ClueEvaluatorLib.src.models.expected_value as ExpectedValueModels
 import ClueEvaluatorLib.src.models.items as ItemModels
+import ClueEvaluatorLib.src.models.matching as MatchingModels
 import ClueEvaluatorLib.src.models.statistics as StatisticModels
-from ClueEvaluatorLib.src.models.base import Configuration
-from ClueEvaluatorLib.src.models.runtime import Runtime
+from ClueEvaluatorLib.src.models.base import Configuration, DBBaseModel
+from ClueEvaluatorLib.src.models.migrations import migrate_schema
+from ClueEvaluatorLib.src.models.pricing import PriceFetcher
+from ClueEvaluatorLib.src.models.runtime import CATALOG_RESPONSES, STATISTICS_RESPONSES, Runtime
+from ClueEvaluatorLib.src.models.sessions import PlayerSession
+from ClueEvaluatorLib.src.models.util import CatalogSyncResult
 
 app = FastAPI(debug=True)
 
@@ -34,7 +42,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-SETTINGS: StatisticModels.InitParams
 RUNTIME: Runtime
 
 CONFIG: Configuration
@@ -47,19 +54,68 @@ CONFIG_PATH = os.path.join(
 )
 
 
+DB_FILEPATH = "C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\test.db"
+
+
 def config_status() -> bool:
     return os.path.exists(CONFIG_PATH)
 
 
-OBJECT_TYPES = [
+def remove_database(filepath: str) -> None:
+    """Removes an SQLite database together with its WAL and shared memory files."""
+    for path in (filepath, f"{filepath}-wal", f"{filepath}-shm"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+OBJECT_TYPES: list[type[DBBaseModel]] = [
     StatisticModels.InitParams,
     StatisticModels.Statistics,
     ItemModels.ItemQuantity,
     ItemModels.DropSources,
     ItemModels.ItemModifiers,
     ItemModels.Item,
+    ItemModels.ItemDropSource,
+    ItemModels.CatalogRow,
 ]
 
+ITEMS_ADAPTER = TypeAdapter(list[ItemModels.Item])
+
+
+def get_session(player_name: str) -> PlayerSession:
+    session = RUNTIME.get_session(player_name) if "RUNTIME" in globals() else None
+    if session is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No active session for the given player, initialize it first.",
+        )
+    return session
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags or "*" in tags
+
+
+async def cached_json(
+    request: Request, scope: str, key: str, build: Callable[[], Awaitable[bytes]]
+) -> Response:
+    """Serves a JSON body from the runtime's response cache, building it on a miss.
+
+    Responses carry an ETag, a matching ``If-None-Match`` is answered with 304.
+    """
+    entry = RUNTIME.responses.get(scope, key)
+    if entry is None:
+        generation = RUNTIME.responses.generation
+        entry = RUNTIME.responses.put(scope, key, await build(), generation=generation)
+    headers = {"ETag": entry.etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 
 @app.get("/")  # type: ignore[misc]
 def read_root() -> dict[str, Any]:
@@ -69,20 +125,19 @@ def read_root() -> dict[str, Any]:
 @app.post("/configure/")  # type: ignore[misc]
 async def configure(configuration_parameters: dict[str, dict[str, str]]) -> bool:
     global CONFIG_PATH, CONFIG
-    with open(CONFIG_PATH) as fp:
+    with open(CONFIG_PATH, "w") as fp:
         for section, vars in configuration_parameters.items():
             fp.write(f"[{section}]\n")
             [fp.write(f"{name}={data}\n") for name, data in vars.items()]
             fp.write("\n")
 
-    CONFIG = Configuration()
-    CONFIG.from_config_file(CONFIG_PATH)
+    CONFIG = Configuration.load(CONFIG_PATH)
     return True
 
 
 @app.post("/initialize/")  # type: ignore[misc]
 async def initialize_plugin(parameters: StatisticModels.InitParams) -> dict[str, Any]:
-    global SETTINGS, RUNTIME, CONFIG
+    global RUNTIME, CONFIG
     # if not config_status():
     #     raise HTTPException(
     #         status_code=status.HTTP_405_METHOD_NOT_ALLOWED,
@@ -92,65 +147,90 @@ async def initialize_plugin(parameters: StatisticModels.InitParams) -> dict[str,
     #     )
     # CONFIG = Configuration()
     # CONFIG.from_config_file(CONFIG_PATH)
-
-    SETTINGS = copy.deepcopy(parameters)
-    if SETTINGS is None:
-        raise HTTPException(
-            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-            detail="Initialize failed: Could not create Plugin object.",
-        )
-    try:
-        if parameters.rebuild_db:
-            if os.path.exists("C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\test.db"):
-                os.remove("C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\test.db")
-
-    except PermissionError:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail=(
-                "Initialize failed: "
-                "Could not recreate database as it is already in use. "
-                "If you want to rebuild the database, "
-                "you must restart the plugin. "
+    if config_status():
+        CONFIG = Configuration.load(CONFIG_PATH)
+
+    settings = copy.deepcopy(parameters)
+    # Players share one runtime, it is only rebuilt on request.
+    if parameters.rebuild_db or "RUNTIME" not in globals():
+        active: list[PlayerSession] = []
+        if "RUNTIME" in globals():
+            # Closing releases the pooled connections on the database file and
+            # writes the statistics of every open session before it is removed.
+            active = RUNTIME.sessions.active()
+            await RUNTIME.close()
+
+        rebuild = parameters.rebuild_db
+        if rebuild:
+            try:
+                remove_database(DB_FILEPATH)
+            except PermissionError:
+                rebuild = False
+
+        RUNTIME = Runtime(
+            csv_filepath="C:\\Development\\RS3\\tinkers\\testcsv.csv",
+            db_filepath=DB_FILEPATH,
+            db_object_types=OBJECT_TYPES,
+            db_echo=False,
+            price_fetcher=(
+                PriceFetcher(
+                    base_url=CONFIG.price_base_url,
+                    concurrency=CONFIG.price_concurrency,
+                    timeout=CONFIG.price_timeout,
+                )
+                if "CONFIG" in globals()
+                else None
             ),
+            snapshot_filepath="C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\catalog.snapshot",
+            price_cache_filepath="C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\prices.db",
         )
-
-    RUNTIME = Runtime(
-        csv_filepath="C:\\Development\\RS3\\tinkers\\testcsv.csv",
-        db_filepath="C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\test.db",
-        db_object_types=OBJECT_TYPES,
-        db_echo=False,
-    )
-    if parameters.rebuild_db:
-        print("Recreating Models")
-        await RUNTIME.reader._get_data()
-        await RUNTIME.dbhandler.create_all_models(object_types=OBJECT_TYPES)
-        print("Rebuilding Database")
-        await RUNTIME.build_database()
-
-        stats = StatisticModels.Statistics(
-            player_name=parameters.player_name,
-            openend_caskets=0,
-            uniques=0,
-            broadcasts=0,
-        )
-
-        await RUNTIME.add_player(params=parameters, stats=stats)
-    await RUNTIME.init_evaluator(
-        await RUNTIME.get_player_stats(parameters.player_name),
-    )
+        await migrate_schema(RUNTIME.dbhandler, OBJECT_TYPES)
+        if rebuild:
+            print("Rebuilding Database")
+            await RUNTIME.load_data()
+            await RUNTIME.update_prices()
+            await RUNTIME.build_database()
+            for session in active:
+                await RUNTIME.add_player(session.settings, session.stats)
+        await RUNTIME.build_catalog()
+        await RUNTIME.start()
+
+        # Players connected to the old runtime keep their sessions.
+        for session in active:
+            await RUNTIME.open_session(session.settings)
+        if parameters.rebuild_db and not rebuild:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=(
+                    "Initialize failed: "
+                    "Could not recreate database as it is already in use. "
+                    "If you want to rebuild the database, "
+                    "you must restart the plugin. "
+                ),
+            )
+
+    await RUNTIME.open_session(settings)
     return {
         "message": "Initialization ran successful.",
     }
 
 
-@lru_cache(maxsize=5)
+@app.post("/catalog/sync")  # type: ignore[misc]
+async def sync_catalog() -> CatalogSyncResult:
+    if "RUNTIME" not in globals():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Initialization not done yet. Could not sync the catalog.",
+        )
+    return await RUNTIME.sync_catalog()
+
+
 @app.get("/player/name")  # type: ignore[misc]
 async def get_player_name() -> dict[str, Any]:
-
-    if SETTINGS:
+    session = RUNTIME.sessions.latest() if "RUNTIME" in globals() else None
+    if session:
         return {
-            "message": SETTINGS.player_name,
+            "message": session.player_name,
         }
     raise HTTPException(
         status_code=status.HTTP_404_NOT_FOUND,
@@ -158,43 +238,146 @@ async def get_player_name() -> dict[str, Any]:
     )
 
 
-@app.get("/python/items")  # type: ignore[misc]
-async def get_python_items() -> list[ItemModels.Item]:
-    return await RUNTIME.get_items()
+@app.get("/python/items", response_model=list[ItemModels.Item])  # type: ignore[misc]
+async def get_python_items(request: Request) -> Response:
+    async def build() -> bytes:
+        return ITEMS_ADAPTER.dump_json(await RUNTIME.get_items())
 
+    return await cached_json(request, CATALOG_RESPONSES, "all", build)
 
-@lru_cache(maxsize=5)
-@app.get("/items/")  # type: ignore[misc]
-async def get_item(item_name: str) -> Optional[ItemModels.Item]:
-    item: Optional[ItemModels.Item] = await RUNTIME.get_item(item_name)
-    if item:
-        return item
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Could not find the requested item.",
-    )
 
+@app.get("/items/", response_model=ItemModels.Item)  # type: ignore[misc]
+async def get_item(request: Request, item_name: str) -> Response:
+    async def build() -> bytes:
+        item: Optional[ItemModels.Item] = await RUNTIME.get_item(item_name)
+        if item:
+            return item.model_dump_json().encode()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find the requested item.",
+        )
 
-@lru_cache(maxsize=5)
-@app.get("/player/statistics")  # type: ignore[misc]
-async def get_statistics(player_name: str) -> Optional[StatisticModels.Statistics]:
-    stats: Optional[StatisticModels.Statistics] = await RUNTIME.get_player_stats(
-        player_name,
-    )
-    if stats:
-        return stats
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Could not find statistics for the given player.",
-    )
+    return await cached_json(request, CATALOG_RESPONSES, f"item:{item_name}", build)
 
 
-@app.get("/update/wealthevaluator")  # type: ignore[misc]
-async def update_evaluator() -> dict[str, Any]:
-    if RUNTIME.evaluator:
-        return await RUNTIME.evaluator.get_info()
+@app.get("/items/search")  # type: ignore[misc]
+async def search_items(prefix: str, limit: int = 10) -> list[ItemModels.Item]:
+    return await RUNTIME.search_items(prefix, limit=limit)
 
-    raise HTTPException(
-        status_code=status.HTTP_404_NOT_FOUND,
-        detail="Initialization not done yet. Could not retrieve player name.",
-    )
+
+@app.get("/items/category")  # type: ignore[misc]
+async def get_category_items(category: str) -> list[ItemModels.Item]:
+    return list(RUNTIME.catalog.by_category(category))
+
+
+@app.get("/items/droptable")  # type: ignore[misc]
+async def get_droptable_items(droptable: str) -> list[ItemModels.Item]:
+    return list(RUNTIME.catalog.by_droptable(droptable))
+
+
+@app.get("/expected-value/")  # type: ignore[misc]
+async def get_expected_values(tier: Optional[str] = None) -> list[ExpectedValueModels.CasketExpectation]:
+    return await RUNTIME.get_expected_values(tier)
+
+
+@app.get("/simulation/")  # type: ignore[misc]
+async def simulate_caskets(
+    tier: str,
+    caskets: int = Query(1_000_000, gt=0, le=100_000_000),
+    seed: Optional[int] = None,
+    player_name: Optional[str] = None,
+) -> StreamingResponse:
+    # Errors have to be raised before the response starts streaming.
+    if player_name is not None:
+        get_session(player_name)
+    try:
+        reports = RUNTIME.simulate(tier, caskets, seed=seed, player_name=player_name)
+    except KeyError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find the requested casket tier.",
+        )
+
+    async def stream() -> Any:
+        async for report in reports:
+            yield report.model_dump_json() + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/ocr/resolve")  # type: ignore[misc]
+async def resolve_ocr_items(request: MatchingModels.ResolveRequest) -> list[MatchingModels.ResolvedItem]:
+    return await RUNTIME.resolve_items(request.text, min_confidence=request.min_confidence)
+
+
+@app.get("/player/statistics", response_model=StatisticModels.Statistics)  # type: ignore[misc]
+async def get_statistics(request: Request, player_name: str) -> Response:
+    # Refreshes an open session, even if the response is served from the cache.
+    RUNTIME.get_session(player_name)
+
+    async def build() -> bytes:
+        stats: Optional[StatisticModels.Statistics] = await RUNTIME.get_player_stats(
+            player_name,
+        )
+        if stats:
+            return stats.model_dump_json().encode()
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Could not find statistics for the given player.",
+        )
+
+    return await cached_json(request, STATISTICS_RESPONSES, player_name, build)
+
+
+@app.post("/rewards/")  # type: ignore[misc]
+async def record_rewards(
+    player_name: str,
+    rewards: Union[StatisticModels.CasketReward, list[StatisticModels.CasketReward]],
+) -> list[StatisticModels.CasketResult]:
+    session = get_session(player_name)
+    try:
+        return await RUNTIME.record_rewards(session, rewards if isinstance(rewards, list) else [rewards])
+    except KeyError as error:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Could not find the rewarded item {error.args[0]!r}.",
+        )
+
+
+@app.get("/update/wealthevaluator")  # type: ignore[misc]
+async def update_evaluator(player_name: str) -> dict[str, Any]:
+    return await get_session(player_name).evaluator.get_info()
+
+
+async def _forward_updates(
+    websocket: WebSocket,
+    updates: asyncio.Queue[Optional[dict[str, Any]]],
+    player_name: str,
+) -> None:
+    while (snapshot := await updates.get()) is not None:
+        await websocket.send_json(snapshot)
+        RUNTIME.get_session(player_name)
+    await websocket.close()
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
+
+@app.websocket("/ws/wealthevaluator")  # type: ignore[misc]
+async def push_evaluator(websocket: WebSocket, player_name: str) -> None:
+    await websocket.accept()
+    session = RUNTIME.get_session(player_name) if "RUNTIME" in globals() else None
+    if session is None:
+        await websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+        return
+
+    async with session.updates.subscribe() as updates:
+        sender = asyncio.create_task(_forward_updates(websocket, updates, player_name))
+        receiver = asyncio.create_task(_wait_disconnect(websocket))
+        try:
+            await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            sender.cancel()
+            receiver.cancel()
@@ -33,6 +33,7 @@ document.getElementById('initform').addEventListener('submit', function(event) {
         const endTime = performance.now(); // End time
         const timeTaken = endTime - startTime; // Calculate duration
         document.getElementById('timeTaken').textContent = `Time taken: ${timeTaken.toFixed(2)} ms`; // Display time taken
+        PlayerName = jsonData.player_name;
         AllowUpdates = true;
     })
     .catch(error => {
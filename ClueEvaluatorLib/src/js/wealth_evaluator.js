@@ -1,39 +1,63 @@
-var intervalId = window.setInterval(function(){
-    if (AllowUpdates == false) {
-        return;
-    }
+var wealthEvaluatorSocket = null;
+var wealthEvaluatorPlayer = "";
 
-    fetch(`http://127.0.0.1:8000/update/wealthevaluator`, {
-        method: "GET",
-        headers: {
-            "Content-Type": "application/json"
-        },
-    })
-    .then(response => {
-        if (!response.ok) {
-            throw new Error('Network response was not ok');
-        }
-        // Parse the response body to JSON
-        return response.json();
-    })
-    .then(content => {
-        // Display server response
+function showWealthEvaluator(content) {
+    document.getElementById("num_caskets").textContent = content.stats.opened;
+    document.getElementById("num_uniques").textContent = content.stats.uniques;
+    document.getElementById("num_broadcasts").textContent = content.stats.broadcasts;
 
+    document.getElementById("unique_rate").textContent = content.item_rates.unique_rate;
+    document.getElementById("broadcast_rate").textContent = content.item_rates.broadcast_rate;
+    document.getElementById("we_uniques_hourly").textContent = content.item_rates.uniques_hourly;
 
-        document.getElementById("num_caskets").textContent = content.stats.opened;
-        document.getElementById("num_uniques").textContent = content.stats.uniques;
-        document.getElementById("num_broadcasts").textContent = content.stats.broadcasts;
+    document.getElementById("we_money_total").textContent = content.money_rates.total;
+    document.getElementById("we_money_hourly").textContent = content.money_rates.hourly;
+    document.getElementById("we_money_avg").textContent = content.money_rates.average;
+
+    showWindowRates(content.windows);
+}
+
+function showWindowRates(windows) {
+    var container = document.getElementById("we_windows");
+    container.textContent = "";
+    for (const [name, rates] of Object.entries(windows)) {
+        var line = document.createElement("div");
+        line.textContent = `${name}: ${rates.hourly} GP/h, ${rates.uniques_hourly} uniques/h, `
+            + `${rates.unique_rate} uniques, ${rates.broadcast_rate} broadcasts (${rates.opened} caskets)`;
+        container.appendChild(line);
+    }
+}
 
-        document.getElementById("unique_rate").textContent = content.item_rates.unique_rate;
-        document.getElementById("broadcast_rate").textContent = content.item_rates.broadcast_rate;
+// The server pushes a new state whenever the evaluator changes. The interval
+// only (re)connects the socket once updates are allowed or the player changed.
+var intervalId = window.setInterval(function(){
+    if (wealthEvaluatorSocket !== null && wealthEvaluatorPlayer !== PlayerName) {
+        wealthEvaluatorSocket.close();
+    }
+    if (AllowUpdates == false || wealthEvaluatorSocket !== null) {
+        return;
+    }
 
-        document.getElementById("we_money_total").textContent = content.money_rates.total;
-        document.getElementById("we_money_hourly").textContent = content.money_rates.hourly;
-        document.getElementById("we_money_avg").textContent = content.money_rates.average;
-    })
-    .catch(error => {
-        console.error('Error fetching or processing data:', error);
-    });
+    wealthEvaluatorPlayer = PlayerName;
+    wealthEvaluatorSocket = new WebSocket(
+        `ws://127.0.0.1:8000/ws/wealthevaluator?player_name=${encodeURIComponent(PlayerName)}`
+    );
+    wealthEvaluatorSocket.onmessage = function(event) {
+        if (AllowUpdates == false) {
+            return;
+        }
+        try {
+            showWealthEvaluator(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Error processing wealth evaluator update:', error);
+        }
+    };
+    wealthEvaluatorSocket.onerror = function(error) {
+        console.error('Wealth evaluator connection failed:', error);
+    };
+    wealthEvaluatorSocket.onclose = function() {
+        wealthEvaluatorSocket = null;
+    };
 
 }, UpdateInterval);
 
@@ -41,13 +65,25 @@ var intervalId = window.setInterval(function(){
 // {
 //     "item_rates": {
 //       "unique_rate": "0.00%",
-//       "broadcast_rate": "0.00%"
+//       "broadcast_rate": "0.00%",
+//       "uniques_hourly": "0.00"
 //     },
 //     "money_rates": {
 //       "hourly": "0",
 //       "total": "0",
 //       "average": "0"
 //     },
+//     "windows": {
+//       "10m": {
+//         "opened": "0",
+//         "hourly": "0",
+//         "uniques_hourly": "0.00",
+//         "unique_rate": "0.00%",
+//         "broadcast_rate": "0.00%"
+//       },
+//       "1h": {...},
+//       "session": {...}
+//     },
 //         "stats": {
 //             "opened": 0,
 //             "uniques": 0,
@@ -2,21 +2,53 @@ from __future__ import annotations
 
 import configparser
 import json
-from typing import Any
+from typing import Any, ClassVar, Optional
 
 from pydantic import BaseModel
+from sqlalchemy import TextClause, text
+
+# Stays below SQLite's limit on bound parameters per statement.
+SQLITE_CHUNK_SIZE = 500
 
 
 class DBBaseModel(BaseModel):  # type: ignore
+    identity_columns: ClassVar[tuple[str, ...]] = ()
+    _filter_statements: ClassVar[dict[str, TextClause]] = {}
+
+    @classmethod
+    def db_fields(cls) -> dict[str, tuple[Any, Any]]:
+        return {name: (info.annotation, ...) for name, info in cls.model_fields.items()}
 
     async def as_db_item(self, db_model: Any) -> Any:
+        return db_model(**self.as_db_row())
+
+    def as_db_row(self) -> dict[str, Any]:
         raise NotImplementedError()
 
     def serialize(self) -> bytes:
         ...
         raise NotImplementedError()
 
-    def filter_statement(self) -> str:
+    @classmethod
+    def filter_statement(cls) -> TextClause:
+        """Bound existence query on the identity columns, built once per model.
+
+        ``IS`` compares like ``=`` but also matches ``NULL`` identity values.
+        """
+        table_name = cls.__name__.lower()
+        statement = DBBaseModel._filter_statements.get(table_name)
+        if statement is None:
+            if not cls.identity_columns:
+                raise NotImplementedError()
+            conditions = " AND ".join(f"{column} IS :{column}" for column in cls.identity_columns)
+            statement = text(f"SELECT 1 FROM {table_name} WHERE {conditions} LIMIT 1")
+            DBBaseModel._filter_statements[table_name] = statement
+        return statement
+
+    def filter_parameters(self) -> dict[str, Any]:
+        return dict(zip(self.identity_columns, self.identity()))
+
+    def identity(self) -> tuple[Any, ...]:
         raise NotImplementedError()
 
 
@@ -40,6 +72,19 @@ class Configuration(BaseModel):  # type: ignore
     trail_completed_image_location: ScreenSection
     inventory_image_location: ScreenSection
     use_gpu_processing: bool = False
+    ocr_workers: int = 2
+    ocr_cache_size: int = 256
+    ocr_cache_file: Optional[str] = None
+    price_base_url: str = "https://www.runescape.wiki/w/"
+    price_concurrency: int = 8
+    price_timeout: float = 10.0
+
+    @classmethod
+    def load(cls, filename: str) -> Configuration:
+        """Builds the configuration from a config file, the screen sections are read from it."""
+        configuration = cls.model_construct()
+        configuration.from_config_file(filename)
+        return configuration
 
     def from_config_file(self, filename: str) -> None:
         config = configparser.ConfigParser()
@@ -49,6 +94,13 @@ class Configuration(BaseModel):  # type: ignore
         self.use_gpu_processing = bool(
             config["ImageProcessing"]["use_gpu_processing"],
         )
+        self.ocr_workers = config["ImageProcessing"].getint("ocr_workers", self.ocr_workers)
+        self.ocr_cache_size = config["ImageProcessing"].getint("ocr_cache_size", self.ocr_cache_size)
+        self.ocr_cache_file = config["ImageProcessing"].get("ocr_cache_file", self.ocr_cache_file)
+        if config.has_section("Prices"):
+            self.price_base_url = config["Prices"].get("base_url", self.price_base_url)
+            self.price_concurrency = config["Prices"].getint("concurrency", self.price_concurrency)
+            self.price_timeout = config["Prices"].getfloat("timeout", self.price_timeout)
 
     def _get_screensection_values(self, data_dict: configparser.SectionProxy) -> None:
         for key, value in data_dict.items():
@@ -66,8 +118,7 @@ class Configuration(BaseModel):  # type: ignore
 
 
 if __name__ == "__main__":
-    config = Configuration()
-    config.from_config_file(
+    config = Configuration.load(
         filename=("C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\config.ini"),
     )
     print(config.trail_completed_image_location)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Callable, Generic, Hashable, Iterator, Optional, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded mapping evicting the least recently used entry first."""
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("Required arg 'capacity' must be positive.")
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[K]:
+        return iter(self._entries)
+
+    def get(self, key: K) -> Optional[V]:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: K) -> Optional[V]:
+        return self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class CachedResponse:
+    """Encoded response body with its entity tag and expiry time."""
+
+    __slots__ = ("body", "etag", "expires")
+
+    def __init__(self, body: bytes, expires: float):
+        self.body = body
+        self.etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        self.expires = expires
+
+
+class ResponseCache:
+    """Encoded read responses grouped by scope, with a TTL and explicit invalidation.
+
+    Entity tags are derived from the body, so a response rebuilt after an
+    invalidation keeps its tag as long as its content did not change. Every
+    invalidation bumps ``generation``; a body built before it is served but
+    not stored.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 256,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.clock = clock
+        self.generation = 0
+        self._entries: LRUCache[tuple[str, str], CachedResponse] = LRUCache(capacity)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, scope: str, key: str = "") -> Optional[CachedResponse]:
+        entry = self._entries.get((scope, key))
+        if entry is not None and entry.expires <= self.clock():
+            self._entries.pop((scope, key))
+            return None
+        return entry
+
+    def put(self, scope: str, key: str, body: bytes, generation: Optional[int] = None) -> CachedResponse:
+        entry = CachedResponse(body, self.clock() + self.ttl)
+        if generation is None or generation == self.generation:
+            self._entries.put((scope, key), entry)
+        return entry
+
+    def invalidate(self, scope: Optional[str] = None, key: Optional[str] = None) -> None:
+        """Drops one entry, every entry of ``scope`` or, without arguments, everything."""
+        self.generation += 1
+        if scope is None:
+            self._entries.clear()
+        elif key is not None:
+            self._entries.pop((scope, key))
+        else:
+            for cached_key in [cached_key for cached_key in self._entries if cached_key[0] == scope]:
+                self._entries.pop(cached_key)
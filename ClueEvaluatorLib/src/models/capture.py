@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.base import ScreenSection
+    from ClueEvaluatorLib.src.models.image_procssing import ImageRecongition
+except:  # noqa: E722
+    from base import ScreenSection  # type: ignore[no-redef]
+    from image_procssing import ImageRecongition  # type: ignore[no-redef]
+
+RegionKey = tuple[str, int, int, int, int]
+
+
+def region_key(kind: str, section: ScreenSection) -> RegionKey:
+    return (kind, section.top, section.left, section.width, section.height)
+
+
+class CaptureStats(BaseModel):  # type: ignore
+    frames_captured: int = 0
+    frames_recognized: int = 0
+
+    @property
+    def frames_skipped(self) -> int:
+        return self.frames_captured - self.frames_recognized
+
+    def skip_rate(self) -> float:
+        return self.frames_skipped / self.frames_captured if self.frames_captured else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"captured={self.frames_captured} recognized={self.frames_recognized} "
+            f"skipped={self.frames_skipped} ({self.skip_rate():.1%})"
+        )
+
+
+class CaptureResult(BaseModel):  # type: ignore
+    value: str
+    items: str
+    value_changed: bool
+    items_changed: bool
+
+
+class FrameChangeDetector:
+    """Detects changed regions by comparing downscaled grayscale fingerprints.
+
+    A frame counts as changed once the mean absolute difference to the last
+    recognized frame of the same region exceeds ``tolerance`` grey levels.
+    """
+
+    def __init__(self, size: tuple[int, int] = (32, 16), tolerance: float = 2.0):
+        self.size = size
+        self.tolerance = tolerance
+        self._fingerprints: dict[RegionKey, np.ndarray] = {}
+
+    def fingerprint(self, image: MatLike) -> np.ndarray:
+        if image.ndim == 3:
+            code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            image = cv2.cvtColor(image, code)
+        return cv2.resize(image, self.size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def changed(self, key: RegionKey, image: MatLike) -> bool:
+        fingerprint = self.fingerprint(image)
+        previous = self._fingerprints.get(key)
+        if previous is not None and float(np.abs(fingerprint - previous).mean()) <= self.tolerance:
+            return False
+        self._fingerprints[key] = fingerprint
+        return True
+
+    def reset(self) -> None:
+        self._fingerprints.clear()
+
+
+class ContinuousCapture:
+    """Captures the reward regions in a loop and only recognizes changed frames.
+
+    Unchanged frames reuse the last recognition result of their region.
+    """
+
+    def __init__(
+        self,
+        recognizer: ImageRecongition,
+        detector: Optional[FrameChangeDetector] = None,
+        interval: float = 0.5,
+    ):
+        self.recognizer = recognizer
+        self.detector = detector or FrameChangeDetector()
+        self.interval = interval
+        self.stats = CaptureStats()
+        self._results: dict[RegionKey, str] = {}
+
+    async def _capture_region(
+        self,
+        kind: str,
+        section: ScreenSection,
+        recognize: Callable[[MatLike], Awaitable[str]],
+    ) -> tuple[str, bool]:
+        key = region_key(kind, section)
+        image = await self.recognizer._mss_get_image(section)
+        self.stats.frames_captured += 1
+        if not self.detector.changed(key, image) and key in self._results:
+            return self._results[key], False
+
+        self.stats.frames_recognized += 1
+        self._results[key] = await recognize(image)
+        return self._results[key], True
+
+    async def capture(self, value_params: ScreenSection, items_params: ScreenSection) -> CaptureResult:
+        (value, value_changed), (items, items_changed) = await asyncio.gather(
+            self._capture_region("value", value_params, self.recognizer.recognize_reward_value),
+            self._capture_region("items", items_params, self.recognizer.recognize_reward_items),
+        )
+        return CaptureResult(
+            value=value,
+            items=items,
+            value_changed=value_changed,
+            items_changed=items_changed,
+        )
+
+    async def run(
+        self,
+        value_params: ScreenSection,
+        items_params: ScreenSection,
+        only_changes: bool = True,
+    ) -> AsyncIterator[CaptureResult]:
+        while True:
+            result = await self.capture(value_params, items_params)
+            if result.value_changed or result.items_changed or not only_changes:
+                yield result
+            await asyncio.sleep(self.interval)
+
+    def reset(self) -> None:
+        self.detector.reset()
+        self._results.clear()
+        self.stats = CaptureStats()
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from types import MappingProxyType
+from typing import Iterable, Mapping, Optional
+
+try:
+    from ClueEvaluatorLib.src.models.items import Item
+except:  # noqa: E722
+    from items import Item  # type: ignore[no-redef]
+
+
+def _key(name: str) -> str:
+    return name.strip().lower()
+
+
+class CatalogIndex:
+    """Read-only lookup structure over the item catalog.
+
+    Built once per initialization, names are matched case-insensitively and
+    prefix searches run on a sorted key list via bisection.
+    """
+
+    def __init__(self, items: Iterable[Item]):
+        self._items: tuple[Item, ...] = tuple(items)
+
+        by_display: dict[str, Item] = {}
+        by_internal: dict[str, Item] = {}
+        by_category: dict[str, list[Item]] = {}
+        by_droptable: dict[str, list[Item]] = {}
+        for item in self._items:
+            by_display.setdefault(_key(item.display_name), item)
+            if item.internal_name:
+                by_internal.setdefault(_key(item.internal_name), item)
+            by_category.setdefault(_key(item.category), []).append(item)
+            by_droptable.setdefault(_key(item.droptable), []).append(item)
+
+        self._by_display: Mapping[str, Item] = MappingProxyType(by_display)
+        self._by_internal: Mapping[str, Item] = MappingProxyType(by_internal)
+        self._by_category: Mapping[str, tuple[Item, ...]] = MappingProxyType(
+            {key: tuple(values) for key, values in by_category.items()},
+        )
+        self._by_droptable: Mapping[str, tuple[Item, ...]] = MappingProxyType(
+            {key: tuple(values) for key, values in by_droptable.items()},
+        )
+        self._prefix_keys: tuple[str, ...] = tuple(sorted(by_display))
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def items(self) -> tuple[Item, ...]:
+        return self._items
+
+    def get(self, name: str) -> Optional[Item]:
+        key = _key(name)
+        return self._by_display.get(key) or self._by_internal.get(key)
+
+    def get_by_display_name(self, display_name: str) -> Optional[Item]:
+        return self._by_display.get(_key(display_name))
+
+    def get_by_internal_name(self, internal_name: str) -> Optional[Item]:
+        return self._by_internal.get(_key(internal_name))
+
+    def by_category(self, category: str) -> tuple[Item, ...]:
+        return self._by_category.get(_key(category), ())
+
+    def by_droptable(self, droptable: str) -> tuple[Item, ...]:
+        return self._by_droptable.get(_key(droptable), ())
+
+    def categories(self) -> list[str]:
+        return sorted({item.category for item in self._items})
+
+    def droptables(self) -> list[str]:
+        return sorted({item.droptable for item in self._items})
+
+    def search_prefix(self, prefix: str, limit: int = 10) -> list[Item]:
+        key = _key(prefix)
+        matches: list[Item] = []
+        position = bisect_left(self._prefix_keys, key)
+        while position < len(self._prefix_keys) and len(matches) < limit:
+            candidate = self._prefix_keys[position]
+            if not candidate.startswith(key):
+                break
+            matches.append(self._by_display[candidate])
+            position += 1
+        return matches
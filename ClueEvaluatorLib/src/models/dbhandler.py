@@ -1,136 +1,502 @@
 from __future__ import annotations
 
-import pickle
-from typing import Any, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Iterable, Optional, Sequence
 
 from pydantic import create_model
-from sqlalchemy import inspect, text
-from sqlmodel import Field, Session, SQLModel, create_engine, select
+from sqlalchemy import Index, bindparam, event, insert, inspect, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncConnection, async_sessionmaker, create_async_engine
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 try:
-    from ClueEvaluatorLib.src.models.base import DBBaseModel
-    from ClueEvaluatorLib.src.models.items import Item
+    from ClueEvaluatorLib.src.models.base import SQLITE_CHUNK_SIZE, DBBaseModel
+    from ClueEvaluatorLib.src.models.items import CatalogRow, Item, ItemDropSource
     from ClueEvaluatorLib.src.models.statistics import Statistics
-    from ClueEvaluatorLib.src.models.util import str2bool
 
 except:  # noqa: E722
     from statistics import Statistics  # type: ignore[no-redef,attr-defined]
 
-    from base import DBBaseModel  # type: ignore[no-redef]
-    from items import Item  # type: ignore[no-redef]
-    from util import str2bool  # type: ignore[no-redef]
+    from base import SQLITE_CHUNK_SIZE, DBBaseModel  # type: ignore[no-redef]
+    from items import CatalogRow, Item, ItemDropSource  # type: ignore[no-redef]
+
+ITEM_BY_NAME = text("SELECT * FROM item WHERE display_name = :display_name")
+ALL_ITEMS = text("SELECT * FROM item")
+ALL_ITEM_SOURCES = text("SELECT item_name, name, rate, decimal_rate, modifier FROM itemdropsource")
+ITEM_SOURCES_BY_NAME = text(
+    "SELECT item_name, name, rate, decimal_rate, modifier FROM itemdropsource WHERE item_name IN :item_names",
+).bindparams(bindparam("item_names", expanding=True))
+CATALOG_FINGERPRINTS = text(
+    "SELECT item.display_name, catalogrow.fingerprint FROM item "
+    "LEFT JOIN catalogrow ON catalogrow.display_name = item.display_name"
+)
+DELETE_ITEMS = text("DELETE FROM item WHERE display_name IN :item_names").bindparams(
+    bindparam("item_names", expanding=True),
+)
+DELETE_ITEM_SOURCES = text("DELETE FROM itemdropsource WHERE item_name IN :item_names").bindparams(
+    bindparam("item_names", expanding=True),
+)
+DELETE_CATALOG_ROWS = text("DELETE FROM catalogrow WHERE display_name IN :item_names").bindparams(
+    bindparam("item_names", expanding=True),
+)
+PRUNE_DROPSOURCES = text(
+    "DELETE FROM dropsources WHERE NOT EXISTS (SELECT 1 FROM itemdropsource AS source "
+    "WHERE source.modifier = 0 AND source.name = dropsources.name AND source.rate = dropsources.rate)"
+)
+PRUNE_QUANTITIES = text(
+    "DELETE FROM itemquantity WHERE NOT EXISTS (SELECT 1 FROM item "
+    "WHERE item.minquantity = itemquantity.minquantity AND item.maxquantity = itemquantity.maxquantity)"
+)
+MODIFIER_QUANTITIES = text("SELECT display_name, modifier_minquantity, modifier_maxquantity FROM item")
+MODIFIER_SOURCES = text(
+    "SELECT item_name, name, rate FROM itemdropsource WHERE modifier = 1 ORDER BY id",
+)
+ALL_MODIFIERS = text("SELECT id, minquantity, maxquantity, dropsources FROM itemmodifiers")
+DELETE_MODIFIERS = text("DELETE FROM itemmodifiers WHERE id IN :ids").bindparams(
+    bindparam("ids", expanding=True),
+)
+SAVE_PLAYER_STATS = text(
+    "INSERT INTO statistics (player_name, openend_caskets, uniques, broadcasts, total_value) "
+    "VALUES (:player_name, :openend_caskets, :uniques, :broadcasts, :total_value) "
+    "ON CONFLICT(player_name) DO UPDATE SET openend_caskets = excluded.openend_caskets, "
+    "uniques = excluded.uniques, broadcasts = excluded.broadcasts, total_value = excluded.total_value"
+)
+PLAYER_STATS = text(
+    "SELECT player_name, openend_caskets, uniques, broadcasts, total_value "
+    "FROM statistics WHERE player_name = :player_name",
+)
+
+TABLE_MODELS: dict[type[DBBaseModel], Any] = {}
+
+
+def table_model(object_type: type[DBBaseModel]) -> Any:
+    """SQLModel table class of ``object_type``, generated once per process.
+
+    Table classes register themselves on the shared ``SQLModel.metadata``,
+    generating a second class for the same table would fail.
+    """
+    db_model = TABLE_MODELS.get(object_type)
+    if db_model is not None:
+        return db_model
+
+    table_name = str(object_type.__name__)
+    field_definitions: dict[str, Any] = {
+        "id": (int, Field(default=None, primary_key=True)),
+    }
+    field_definitions.update(object_type.db_fields())
+    db_model = create_model(
+        table_name,
+        __base__=SQLModel,
+        __cls_kwargs__={"table": True},
+        **field_definitions,
+    )
+    if object_type.identity_columns:
+        Index(
+            f"ux_{table_name.lower()}_identity",
+            *[db_model.__table__.c[column] for column in object_type.identity_columns],
+            unique=True,
+        )
+    TABLE_MODELS[object_type] = db_model
+    return db_model
 
 
 class DataBaseHandler:
-    def __init__(self, dbfile: str, echo: bool = True, db_object_types: list[type[DBBaseModel]] = []):
+    def __init__(
+        self,
+        dbfile: str,
+        echo: bool = True,
+        db_object_types: list[type[DBBaseModel]] = [],
+        bulk_batch_size: int = 500,
+        journal_mode: str = "WAL",
+        bulk_synchronous: str = "OFF",
+        pool_size: int = 5,
+        max_overflow: int = 5,
+        pool_timeout: float = 30.0,
+        busy_timeout: int = 5000,
+    ):
         self.dbfile = dbfile
         self.dbecho = echo
-        self.dburl = f"sqlite:///{dbfile}"
-        self.engine = create_engine(self.dburl, echo=self.dbecho)
-        self.session = Session(self.engine)
-        self.models: dict[str, type[DBBaseModel]] = {}
-        self.inspector = inspect(self.engine)
+        self.dburl = f"sqlite+aiosqlite:///{dbfile}"
+        self.engine = create_async_engine(
+            self.dburl,
+            echo=self.dbecho,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+        )
+        self.session_factory = async_sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.busy_timeout = busy_timeout
+        self.journal_mode = journal_mode
+        event.listen(self.engine.sync_engine, "connect", self._configure_connection)
+        self.models: dict[str, Any] = {}
         self.db_object_types: list[type[DBBaseModel]] = db_object_types
+        self.register_models(db_object_types)
+        self.bulk_batch_size = bulk_batch_size
+        self.bulk_synchronous = bulk_synchronous
 
-    async def check_table_exists(self, table_name: str) -> Any:
-        return await self.inspector.has_table(table_name)
+    def _configure_connection(self, dbapi_connection: Any, connection_record: Any) -> None:
+        # WAL, the default, lets readers proceed while a rebuild is writing.
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"PRAGMA journal_mode={self.journal_mode}")
+        cursor.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
+        cursor.close()
 
-    async def get_all_table_items(self, model: DBBaseModel) -> Any:
-        with self.session as session:
-            return await session.exec(select(model)).all()
+    async def close(self) -> None:
+        await self.engine.dispose()
 
-    async def reload_inspector(self) -> None:
-        self.inspector = inspect(self.engine)
+    async def check_table_exists(self, table_name: str) -> bool:
+        async with self.engine.connect() as connection:
+            return bool(
+                await connection.run_sync(
+                    lambda sync_connection: inspect(sync_connection).has_table(table_name)
+                ),
+            )
 
-    async def make_field_definitions(self, model: DBBaseModel) -> dict[str, Any]:
-        model_fields = model.model_fields
-        field_definitions = {
-            "id": (int, Field(default=None, primary_key=True)),
-        }
-        await self.reload_inspector()
-        table_names = self.inspector.get_table_names()
-        for name, info in model_fields.items():
-            print(
-                f"\tCreating field definition for {name} with annotation: {info.annotation}",
+    async def get_table_columns(self, table_name: str) -> list[str]:
+        async with self.engine.connect() as connection:
+            return list(
+                await connection.run_sync(
+                    lambda sync_connection: [
+                        column["name"] for column in inspect(sync_connection).get_columns(table_name)
+                    ],
+                ),
             )
 
-            if name not in table_names:
-                field_definitions[name] = (info.annotation, ...)
-            else:
-                print(
-                    f"Setting foreign key for {model.__name__} attribute: {name}",
-                )
-                field_definitions[name] = (str, ...)  # type: ignore[assignment]
-        return field_definitions
+    async def get_all_table_items(self, model: DBBaseModel) -> Any:
+        async with self.session_factory() as session:
+            return (await session.exec(select(model))).all()
+
+    async def get_schema_version(self) -> int:
+        async with self.engine.connect() as connection:
+            return int((await connection.exec_driver_sql("PRAGMA user_version")).scalar() or 0)
 
-    async def create_all_models(self, object_types: Any) -> None:
+    async def set_schema_version(self, version: int) -> None:
+        async with self.engine.begin() as connection:
+            await connection.exec_driver_sql(f"PRAGMA user_version={int(version)}")
+
+    def register_models(self, object_types: Iterable[type[DBBaseModel]]) -> None:
         for object_type in object_types:
-            model_name = f"{object_type.__name__}"
-            print(f"Creating db_model for  {model_name} ...")
-            self.models[f"{model_name.lower()}_model"] = await self.create_model(object_type)
-            print(f"Successfully create db_model for {model_name}")
-            SQLModel.metadata.create_all(self.engine)
-
-    async def create_model(self, model: Any) -> Any:
-        field_definitions = await self.make_field_definitions(model)
-        table_name = str(model.__name__)
-        return create_model(
-            table_name,
-            __base__=SQLModel,
-            __cls_kwargs__={"table": True},
-            **field_definitions,
-        )
+            self.models[f"{object_type.__name__.lower()}_model"] = table_model(object_type)
+
+    async def create_tables(self, object_types: Iterable[type[DBBaseModel]]) -> None:
+        """Creates the missing tables and identity indexes of ``object_types`` in one transaction."""
+        object_types = list(object_types)
+        self.register_models(object_types)
+        tables = [table_model(object_type).__table__ for object_type in object_types]
+        async with self.engine.begin() as connection:
+            await connection.run_sync(SQLModel.metadata.create_all, tables=tables)
+            await connection.run_sync(self._create_identity_indexes, tables)
+
+    def _create_identity_indexes(self, connection: Any, tables: list[Any]) -> None:
+        # create_all skips indexes of tables that already exist.
+        for table in tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+
+    async def remove_duplicate_identities(self, object_types: Iterable[type[DBBaseModel]]) -> int:
+        """Deletes rows sharing their identity with a later row, returns how many were deleted.
+
+        Tables written before the identity indexes existed can hold
+        duplicates, which would make creating the unique indexes fail.
+        """
+        removed = 0
+        async with self.engine.begin() as connection:
+            for object_type in object_types:
+                table_name = object_type.__name__.lower()
+                if not object_type.identity_columns or not await connection.run_sync(
+                    lambda sync_connection: inspect(sync_connection).has_table(table_name)
+                ):
+                    continue
+                columns = ", ".join(object_type.identity_columns)
+                result = await connection.execute(
+                    text(
+                        f"DELETE FROM {table_name} WHERE id NOT IN "
+                        f"(SELECT MAX(id) FROM {table_name} GROUP BY {columns})"
+                    ),
+                )
+                if result.rowcount:
+                    print(f"Removed {result.rowcount} duplicate rows from {table_name}")
+                    removed += result.rowcount
+        return removed
 
     async def add_db_item(
-        self, item: DBBaseModel, check_existence: bool = True, instant_commit: bool = True
+        self,
+        item: DBBaseModel,
+        check_existence: bool = True,
+        instant_commit: bool = True,
+        session: Optional[AsyncSession] = None,
     ) -> None:
+        """Adds an item within ``session`` or, if omitted, within its own committed session."""
+        if session is None:
+            async with self.session_factory() as own_session:
+                await self.add_db_item(item, check_existence=check_existence, session=own_session)
+                await own_session.commit()
+            return
+
         db_item = await item.as_db_item(db_model=self.models[f"{item.__class__.__name__.lower()}_model"])
+        if not check_existence or not await self.check_existence(item, session=session):
+            session.add(db_item)
+
+        if instant_commit:
+            await session.commit()
+
+    @asynccontextmanager
+    async def bulk_load(self) -> AsyncIterator[AsyncConnection]:
+        """Provides a single connection tuned for bulk inserts.
+
+        The synchronous level is lowered for the lifetime of the yielded
+        connection, the journal mode is the one of every connection.
+        """
+        async with self.engine.connect() as connection:
+            previous_synchronous = (await connection.exec_driver_sql("PRAGMA synchronous")).scalar()
+            await connection.exec_driver_sql(f"PRAGMA synchronous={self.bulk_synchronous}")
+            try:
+                yield connection
+            finally:
+                await connection.rollback()
+                await connection.exec_driver_sql(f"PRAGMA synchronous={previous_synchronous}")
+
+    async def get_existing_identities(
+        self, connection: AsyncConnection, object_type: type[DBBaseModel]
+    ) -> set[tuple[Any, ...]]:
+        if not object_type.identity_columns:
+            return set()
+        table = self.models[f"{object_type.__name__.lower()}_model"].__table__
+        statement = select(*[table.c[column] for column in object_type.identity_columns])
+        return {tuple(row) for row in await connection.execute(statement)}
+
+    async def bulk_add_db_items(
+        self,
+        connection: AsyncConnection,
+        object_type: type[DBBaseModel],
+        items: Iterable[DBBaseModel],
+        check_existence: bool = True,
+        batch_size: Optional[int] = None,
+    ) -> int:
+        """Inserts all items of one model type within a single transaction.
+
+        Existence is resolved in memory against the identities already stored
+        in the table, rows are written with executemany in batches.
+        """
+        batch_size = batch_size or self.bulk_batch_size
+        db_model = self.models[f"{object_type.__name__.lower()}_model"]
+        statement = insert(db_model.__table__)
+        known = await self.get_existing_identities(connection, object_type) if check_existence else set()
+        inserted = 0
+        rows: list[dict[str, Any]] = []
 
-        if check_existence:
-            if not await self.check_existence(item):
-                self.session.add(db_item)
+        for item in items:
+            if check_existence:
+                key = item.identity()
+                if key in known:
+                    continue
+                known.add(key)
+            rows.append(item.as_db_row())
+            if len(rows) >= batch_size:
+                await connection.execute(statement, rows)
+                inserted += len(rows)
+                rows = []
+
+        if rows:
+            await connection.execute(statement, rows)
+            inserted += len(rows)
+        await connection.commit()
+        return inserted
+
+    async def get_catalog_fingerprints(self) -> dict[str, Optional[str]]:
+        """Stored items with the fingerprint of their CSV row, ``None`` if it is unknown."""
+        async with self.engine.connect() as connection:
+            return {row[0]: row[1] for row in await connection.execute(CATALOG_FINGERPRINTS)}
+
+    async def sync_catalog(
+        self,
+        lookups: Iterable[tuple[type[DBBaseModel], Sequence[DBBaseModel]]],
+        items: list[Item],
+        catalog_rows: list[CatalogRow],
+        removed: list[str],
+    ) -> None:
+        """Upserts changed items and deletes removed ones within a single transaction.
+
+        Drop sources, quantities and modifiers of the changed items are only
+        inserted if missing, those no longer referenced by any item are
+        deleted afterwards. Player tables are not touched.
+        """
+        async with self.engine.begin() as connection:
+            for object_type, instances in lookups:
+                known = await self.get_existing_identities(connection, object_type)
+                rows: dict[tuple[Any, ...], dict[str, Any]] = {}
+                for instance in instances:
+                    if instance.identity() not in known:
+                        rows.setdefault(instance.identity(), instance.as_db_row())
+                if rows:
+                    table = self.models[f"{object_type.__name__.lower()}_model"].__table__
+                    await connection.execute(insert(table), list(rows.values()))
+
+            for object_type, instances in ((Item, items), (CatalogRow, catalog_rows)):
+                if instances:
+                    await connection.execute(
+                        self._upsert_statement(object_type),
+                        [instance.as_db_row() for instance in instances],
+                    )
+
+            changed = [item.display_name for item in items]
+            await self._execute_chunked(connection, DELETE_ITEM_SOURCES, "item_names", changed + removed)
+            relations = [relation.as_db_row() for item in items for relation in item.db_relations()]
+            if relations:
+                table = self.models["itemdropsource_model"].__table__
+                await connection.execute(insert(table), relations)
+            await self._execute_chunked(connection, DELETE_ITEMS, "item_names", removed)
+            await self._execute_chunked(connection, DELETE_CATALOG_ROWS, "item_names", removed)
+
+            await connection.execute(PRUNE_DROPSOURCES)
+            await connection.execute(PRUNE_QUANTITIES)
+            await self._prune_modifiers(connection)
+
+    @staticmethod
+    async def _execute_chunked(
+        connection: AsyncConnection, statement: Any, name: str, values: list[Any]
+    ) -> None:
+        """Executes ``statement`` with its expanding ``name`` parameter bound to slices of ``values``.
+
+        Keeps every statement below SQLite's bound variable limit.
+        """
+        for start in range(0, len(values), SQLITE_CHUNK_SIZE):
+            await connection.execute(statement, {name: values[start : start + SQLITE_CHUNK_SIZE]})
+
+    def _upsert_statement(self, object_type: type[DBBaseModel]) -> Any:
+        table = self.models[f"{object_type.__name__.lower()}_model"].__table__
+        statement = sqlite_insert(table)
+        return statement.on_conflict_do_update(
+            index_elements=list(object_type.identity_columns),
+            set_={
+                column.name: statement.excluded[column.name]
+                for column in table.columns
+                if column.name != "id" and column.name not in object_type.identity_columns
+            },
+        )
+
+    async def _prune_modifiers(self, connection: AsyncConnection) -> None:
+        # Modifier drop sources are only stored per item, so the identities
+        # still in use are rebuilt in their original order.
+        sources: dict[str, list[str]] = {}
+        for item_name, name, rate in await connection.execute(MODIFIER_SOURCES):
+            sources.setdefault(item_name, []).append(f"{name}@{rate}")
+        used = {
+            (minquantity, maxquantity, "-".join(sources[item_name]) if item_name in sources else None)
+            for item_name, minquantity, maxquantity in await connection.execute(MODIFIER_QUANTITIES)
+        }
+        unused = [
+            modifier_id
+            for modifier_id, *identity in await connection.execute(ALL_MODIFIERS)
+            if tuple(identity) not in used
+        ]
+        await self._execute_chunked(connection, DELETE_MODIFIERS, "ids", unused)
+
+    async def check_existence(self, item: DBBaseModel, session: Optional[AsyncSession] = None) -> bool:
+        if session is None:
+            async with self.session_factory() as own_session:
+                return await self.check_existence(item, session=own_session)
+        result = await session.execute(item.filter_statement(), item.filter_parameters())
+        return result.first() is not None
+
+    async def _get_item_sources(
+        self, item_names: Optional[list[str]] = None
+    ) -> dict[str, list[ItemDropSource]]:
+        if item_names is None:
+            query, parameters = ALL_ITEM_SOURCES, {}
         else:
-            self.session.add(db_item)
+            query, parameters = ITEM_SOURCES_BY_NAME, {"item_names": item_names}
 
-        if instant_commit:
-            self.session.commit()
+        async with self.session_factory() as session:
+            rows = (await session.execute(query, parameters)).mappings().all()
 
-    async def check_existence(self, item: DBBaseModel) -> bool:
-        return self.session.exec(text(item.filter_statement())).first() is not None
+        sources: dict[str, list[ItemDropSource]] = {}
+        for row in rows:
+            sources.setdefault(row["item_name"], []).append(
+                ItemDropSource(
+                    item_name=row["item_name"],
+                    name=row["name"],
+                    rate=row["rate"],
+                    decimal_rate=row["decimal_rate"],
+                    modifier=bool(row["modifier"]),
+                ),
+            )
+        return sources
 
     async def get_item(self, item_name: str) -> Optional[Item]:
-
-        result = self.session.exec(
-            text(f"SELECT * FROM item WHERE display_name == '{item_name}'"),
-        ).first()
-        if result:
-            return Item(
-                display_name=result[1],
-                internal_name=result[2],
-                itemquantity=pickle.loads(result[3]),
-                is_unique=str2bool(str(result[4])),
-                is_broadcast=str2bool(str(result[5])),
-                noted=str2bool(str(result[6])),
-                dropsources=[pickle.loads(instance) for instance in pickle.loads(result[7])],
-                droptable=result[8],
-                price=result[9],
-                itemmodifiers=pickle.loads(pickle.loads(result[10])),
-                image_id=result[11],
-                category=result[12],
+        async with self.session_factory() as session:
+            result = (
+                (await session.execute(ITEM_BY_NAME, {"display_name": item_name})).mappings().first()
             )
+        if result:
+            sources = await self._get_item_sources([item_name])
+            return Item.from_db(result, sources.get(item_name, []))
         return None
 
+    async def get_all_items(self) -> list[Item]:
+        async with self.session_factory() as session:
+            rows = (await session.execute(ALL_ITEMS)).mappings().all()
+        sources = await self._get_item_sources()
+        return [Item.from_db(row, sources.get(row["display_name"], [])) for row in rows]
+
+    async def find_items(
+        self,
+        source_name: Optional[str] = None,
+        min_rate: Optional[float] = None,
+        max_rate: Optional[float] = None,
+        quantity: Optional[int] = None,
+    ) -> list[Item]:
+        """Filters items by drop source, decimal drop rate and quantity range in SQL."""
+        conditions = ["source.modifier = 0"]
+        parameters: dict[str, Any] = {}
+        if source_name is not None:
+            conditions.append("source.name = :source_name")
+            parameters["source_name"] = source_name
+        if min_rate is not None:
+            conditions.append("source.decimal_rate >= :min_rate")
+            parameters["min_rate"] = min_rate
+        if max_rate is not None:
+            conditions.append("source.decimal_rate <= :max_rate")
+            parameters["max_rate"] = max_rate
+        if quantity is not None:
+            conditions.append("item.minquantity <= :quantity AND item.maxquantity >= :quantity")
+            parameters["quantity"] = quantity
+
+        async with self.session_factory() as session:
+            rows = (
+                (
+                    await session.execute(
+                        text(
+                            "SELECT DISTINCT item.* FROM item "
+                            "JOIN itemdropsource AS source ON source.item_name = item.display_name "
+                            f"WHERE {' AND '.join(conditions)}"
+                        ),
+                        parameters,
+                    )
+                )
+                .mappings()
+                .all()
+            )
+        if not rows:
+            return []
+        sources = await self._get_item_sources([row["display_name"] for row in rows])
+        return [Item.from_db(row, sources.get(row["display_name"], [])) for row in rows]
+
     async def get_player_stats(self, player_name: str) -> Optional[Statistics]:
-        result = self.session.exec(
-            text(
-                f"SELECT * FROM statistics WHERE player_name == '{player_name}'",
-            ),
-        ).first()
-        if result:
-            return Statistics(
-                player_name=result[1],
-                openend_caskets=result[2],
-                uniques=result[3],
-                broadcasts=result[4],
+        async with self.session_factory() as session:
+            result = (
+                (await session.execute(PLAYER_STATS, {"player_name": player_name})).mappings().first()
             )
+        if result:
+            return Statistics(**result)
         return None
+
+    async def save_player_stats(self, stats: Iterable[Statistics]) -> int:
+        rows = [entry.as_db_row() for entry in stats]
+        if rows:
+            async with self.engine.begin() as connection:
+                await connection.execute(SAVE_PLAYER_STATS, rows)
+        return len(rows)
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from typing import Iterable, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.items import DropSources, Item, ItemQuantity
+except:  # noqa: E722
+    from items import DropSources, Item, ItemQuantity  # type: ignore[no-redef]
+
+
+class ExpectedValue(BaseModel):  # type: ignore
+    name: str
+    mean: float
+    variance: float
+    std: float
+    items: int
+    unpriced: int
+
+
+class CasketExpectation(BaseModel):  # type: ignore
+    tier: ExpectedValue
+    droptables: list[ExpectedValue]
+
+
+def quantity_moments(quantity: ItemQuantity) -> tuple[float, float]:
+    """First and second moment of a quantity drawn uniformly from its range."""
+    mean = (quantity.minquantity + quantity.maxquantity) / 2
+    count = quantity.maxquantity - quantity.minquantity + 1
+    return mean, mean * mean + (count * count - 1) / 12
+
+
+class ExpectedValueEngine:
+    """Expected value and variance of a casket per tier and droptable.
+
+    Every (item, drop source) pair becomes one entry whose value is
+    ``rate * quantity * price`` with an independent drop chance ``rate``.
+    Its mean and variance are precomputed per unit price, so both sums are
+    a single weighted ``bincount`` over all entries. Price changes only add
+    the difference of the affected entries.
+    Tiers are the drop source names, e.g. ``easy`` or ``elite``.
+    """
+
+    def __init__(self, items: Iterable[Item], use_modifiers: bool = False):
+        self.items: tuple[Item, ...] = tuple(items)
+        self.use_modifiers = use_modifiers
+        self.item_index: dict[str, int] = {
+            item.display_name: index for index, item in enumerate(self.items)
+        }
+
+        tiers: dict[str, int] = {}
+        droptables: dict[str, int] = {}
+        entry_item: list[int] = []
+        entry_tier: list[int] = []
+        entry_table: list[int] = []
+        first: list[float] = []
+        second: list[float] = []
+        for index, item in enumerate(self.items):
+            quantity, sources = self._drop_parameters(item)
+            mean, square = quantity_moments(quantity)
+            table = droptables.setdefault(item.droptable, len(droptables))
+            for source in sources:
+                rate = float(source.decimal_rate or 0.0)
+                entry_item.append(index)
+                entry_tier.append(tiers.setdefault(source.name, len(tiers)))
+                entry_table.append(table)
+                first.append(rate * mean)
+                second.append(rate * square - (rate * mean) ** 2)
+
+        self.tiers: list[str] = list(tiers)
+        self.droptables: list[str] = list(droptables)
+        self.entry_item = np.asarray(entry_item, dtype=np.int64)
+        self.entry_cell = np.asarray(entry_tier, dtype=np.int64) * len(self.droptables) + np.asarray(
+            entry_table, dtype=np.int64
+        )
+        self.first = np.asarray(first, dtype=np.float64)
+        self.second = np.asarray(second, dtype=np.float64)
+        self.cells = len(self.tiers) * len(self.droptables)
+
+        # Entries grouped by item, so price updates touch only their own slice.
+        self.item_order = np.argsort(self.entry_item, kind="stable")
+        self.item_offsets = np.zeros(len(self.items) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.entry_item, minlength=len(self.items)), out=self.item_offsets[1:])
+
+        self.prices = np.array([item.price or 0 for item in self.items], dtype=np.float64)
+        self.priced = np.array([item.price is not None for item in self.items], dtype=bool)
+        self.entries = np.bincount(self.entry_cell, minlength=self.cells)
+        self.compute()
+
+    def _drop_parameters(self, item: Item) -> tuple[ItemQuantity, list[DropSources]]:
+        modifiers = item.itemmodifiers if self.use_modifiers else None
+        quantity = modifiers.itemquantity if modifiers and modifiers.itemquantity else item.itemquantity
+        sources = modifiers.dropsources if modifiers and modifiers.dropsources else item.dropsources
+        return quantity, sources
+
+    def compute(self) -> None:
+        prices = self.prices[self.entry_item]
+        self.mean = np.bincount(self.entry_cell, weights=self.first * prices, minlength=self.cells)
+        self.variance = np.bincount(
+            self.entry_cell, weights=self.second * prices * prices, minlength=self.cells
+        )
+        self.unpriced = np.bincount(
+            self.entry_cell, weights=~self.priced[self.entry_item], minlength=self.cells
+        ).astype(np.int64)
+
+    def update_prices(self, items: Iterable[Item]) -> int:
+        """Applies the current prices of ``items``, returns the number of changed items."""
+        indices = [
+            index
+            for index in (self.item_index.get(item.display_name) for item in items)
+            if index is not None and self._price_changed(index)
+        ]
+        if not indices:
+            return 0
+        changed = np.asarray(indices, dtype=np.int64)
+        new_prices = np.array([self.items[index].price or 0 for index in indices], dtype=np.float64)
+        new_priced = np.array([self.items[index].price is not None for index in indices], dtype=bool)
+
+        starts, ends = self.item_offsets[changed], self.item_offsets[changed + 1]
+        counts = ends - starts
+        entries = self.item_order[
+            np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)])
+        ]
+        cells = self.entry_cell[entries]
+        price_delta = np.repeat(new_prices - self.prices[changed], counts)
+        square_delta = np.repeat(new_prices**2 - self.prices[changed] ** 2, counts)
+        priced_delta = np.repeat(self.priced[changed].astype(np.int64) - new_priced, counts)
+
+        np.add.at(self.mean, cells, self.first[entries] * price_delta)
+        np.add.at(self.variance, cells, self.second[entries] * square_delta)
+        np.add.at(self.unpriced, cells, priced_delta)
+        self.prices[changed] = new_prices
+        self.priced[changed] = new_priced
+        return len(indices)
+
+    def _price_changed(self, index: int) -> bool:
+        price = self.items[index].price
+        return bool(self.priced[index] != (price is not None) or self.prices[index] != (price or 0))
+
+    def _expected_value(
+        self, name: str, mean: float, variance: float, items: int, unpriced: int
+    ) -> ExpectedValue:
+        variance = max(float(variance), 0.0)
+        return ExpectedValue(
+            name=name,
+            mean=round(float(mean), 2),
+            variance=round(variance, 2),
+            std=round(variance**0.5, 2),
+            items=int(items),
+            unpriced=int(unpriced),
+        )
+
+    def expectations(self, tier: Optional[str] = None) -> list[CasketExpectation]:
+        shape = (len(self.tiers), len(self.droptables))
+        mean, variance = self.mean.reshape(shape), self.variance.reshape(shape)
+        entries, unpriced = self.entries.reshape(shape), self.unpriced.reshape(shape)
+        tier_mean, tier_variance = mean.sum(axis=1), variance.sum(axis=1)
+        tier_entries, tier_unpriced = entries.sum(axis=1), unpriced.sum(axis=1)
+
+        results = []
+        for row, name in enumerate(self.tiers):
+            if tier is not None and name != tier:
+                continue
+            results.append(
+                CasketExpectation(
+                    tier=self._expected_value(
+                        name, tier_mean[row], tier_variance[row], tier_entries[row], tier_unpriced[row]
+                    ),
+                    droptables=[
+                        self._expected_value(
+                            table,
+                            mean[row, column],
+                            variance[row, column],
+                            entries[row, column],
+                            unpriced[row, column],
+                        )
+                        for column, table in enumerate(self.droptables)
+                        if entries[row, column]
+                    ],
+                ),
+            )
+        return results
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Iterable, Optional
+
+import cv2
+import numpy as np
+from cv2.typing import MatLike
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.catalog import CatalogIndex
+    from ClueEvaluatorLib.src.models.items import Item
+    from ClueEvaluatorLib.src.models.matching import ItemMatcher, parse_quantity
+    from ClueEvaluatorLib.src.models.ocr import OCRLine, OCRWorkerPool
+except:  # noqa: E722
+    from catalog import CatalogIndex  # type: ignore[no-redef]
+    from items import Item  # type: ignore[no-redef]
+    from matching import ItemMatcher, parse_quantity  # type: ignore[no-redef]
+    from ocr import OCRLine, OCRWorkerPool  # type: ignore[no-redef]
+
+ATLAS_VERSION = 1
+
+
+def to_gray(image: MatLike) -> np.ndarray:
+    if image.ndim == 2:
+        return np.asarray(image)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_BGRA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def normalize_batch(images: np.ndarray) -> np.ndarray:
+    """Flattens ``(n, height, width)`` images to zero-mean, unit-norm rows."""
+    vectors = images.reshape(len(images), -1).astype(np.float32)
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+class SlotGrid(BaseModel):
+    columns: int
+    rows: int
+    slot_width: int
+    slot_height: int
+    spacing_x: int = 0
+    spacing_y: int = 0
+    offset_x: int = 0
+    offset_y: int = 0
+    quantity_height: int = 12
+
+    def positions(self, image: np.ndarray) -> list[tuple[int, int]]:
+        """Left and top pixel of every slot lying completely inside ``image``."""
+        height, width = image.shape[:2]
+        positions = []
+        for row in range(self.rows):
+            top = self.offset_y + row * (self.slot_height + self.spacing_y)
+            for column in range(self.columns):
+                left = self.offset_x + column * (self.slot_width + self.spacing_x)
+                if top + self.slot_height <= height and left + self.slot_width <= width:
+                    positions.append((left, top))
+        return positions
+
+    def slots(self, image: np.ndarray) -> list[np.ndarray]:
+        return [
+            image[top : top + self.slot_height, left : left + self.slot_width]
+            for left, top in self.positions(image)
+        ]
+
+    def center(self, position: tuple[int, int]) -> tuple[float, float]:
+        return position[0] + self.slot_width / 2, position[1] + self.slot_height / 2
+
+    @property
+    def pitch(self) -> float:
+        return float(max(self.slot_width + self.spacing_x, self.slot_height + self.spacing_y))
+
+
+class SlotMatch(BaseModel):
+    slot: int
+    item: Optional[Item]
+    quantity: int
+    score: float
+
+
+class IconAtlas:
+    """Normalized item icons stacked into one matrix.
+
+    Matching a batch of slots against all icons is a single matrix product of
+    zero-mean, unit-norm vectors, i.e. their normalized cross-correlation.
+    """
+
+    def __init__(self, names: list[str], vectors: np.ndarray, size: tuple[int, int]):
+        self.names = names
+        self.vectors = vectors
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @staticmethod
+    def _load_icon(path: str) -> Optional[np.ndarray]:
+        icon = cv2.imread(path, cv2.IMREAD_UNCHANGED)
+        if icon is None:
+            return None
+        if icon.ndim == 3 and icon.shape[2] == 4:
+            alpha = icon[:, :, 3:4].astype(np.float32) / 255
+            icon = (icon[:, :, :3].astype(np.float32) * alpha).astype(np.uint8)
+        return to_gray(icon)
+
+    @classmethod
+    def build(cls, items: Iterable[Item], image_dir: str, size: tuple[int, int] = (32, 32)) -> IconAtlas:
+        names: list[str] = []
+        icons: list[np.ndarray] = []
+        for item in items:
+            icon = cls._load_icon(os.path.join(image_dir, f"{item.internal_name}.png"))
+            if icon is None:
+                continue
+            names.append(item.display_name)
+            icons.append(cv2.resize(icon, size, interpolation=cv2.INTER_AREA))
+        vectors = (
+            normalize_batch(np.stack(icons)) if icons else np.zeros((0, size[0] * size[1]), np.float32)
+        )
+        print(f"Built icon atlas with {len(names)} icons")
+        return cls(names=names, vectors=vectors, size=size)
+
+    def save(self, path: str) -> None:
+        np.savez(
+            path,
+            version=ATLAS_VERSION,
+            names=np.asarray(self.names, dtype=str),
+            vectors=self.vectors,
+            size=np.asarray(self.size),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Optional[IconAtlas]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            if int(data["version"]) != ATLAS_VERSION:
+                return None
+            return cls(
+                names=[str(name) for name in data["names"]],
+                vectors=data["vectors"],
+                size=(int(data["size"][0]), int(data["size"][1])),
+            )
+
+    @classmethod
+    def load_or_build(
+        cls, path: str, items: Iterable[Item], image_dir: str, size: tuple[int, int] = (32, 32)
+    ) -> IconAtlas:
+        atlas = cls.load(path)
+        if atlas is None or atlas.size != size:
+            atlas = cls.build(items, image_dir, size=size)
+            atlas.save(path)
+        return atlas
+
+    def vectorize(self, slots: list[np.ndarray]) -> np.ndarray:
+        return normalize_batch(
+            np.stack(
+                [cv2.resize(to_gray(slot), self.size, interpolation=cv2.INTER_AREA) for slot in slots]
+            ),
+        )
+
+    def match(self, slots: list[np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+        scores = self.vectorize(slots) @ self.vectors.T
+        best = scores.argmax(axis=1)
+        return best, scores[np.arange(len(best)), best]
+
+
+class IconRecognizer:
+    """Recognizes reward items by matching inventory slots against the atlas.
+
+    OCR is only used for quantities of stackable items and, if an
+    ``ocr_fallback`` is given, for slots without a confident icon match,
+    including every slot while the atlas is empty. Fallback lines are paired
+    with the nearest unmatched slot, lines further than one slot pitch away
+    from all of them are ignored.
+    """
+
+    def __init__(
+        self,
+        atlas: IconAtlas,
+        catalog: CatalogIndex,
+        grid: SlotGrid,
+        ocr_pool: Optional[OCRWorkerPool] = None,
+        matcher: Optional[ItemMatcher] = None,
+        ocr_fallback: Optional[Callable[[MatLike], Awaitable[list[OCRLine]]]] = None,
+        min_score: float = 0.8,
+        empty_slot_deviation: float = 4.0,
+    ):
+        self.atlas = atlas
+        self.catalog = catalog
+        self.grid = grid
+        self.ocr_pool = ocr_pool
+        self.matcher = matcher
+        self.ocr_fallback = ocr_fallback
+        self.min_score = min_score
+        self.empty_slot_deviation = empty_slot_deviation
+
+    async def _read_quantity(self, slot: np.ndarray) -> int:
+        if self.ocr_pool is None:
+            return 1
+        text = await self.ocr_pool.submit(np.ascontiguousarray(slot[: self.grid.quantity_height]))
+        return parse_quantity(text.strip()) or 1
+
+    async def _resolve_unmatched(
+        self, image: MatLike, matches: list[tuple[SlotMatch, tuple[int, int]]]
+    ) -> None:
+        unmatched = [(match, position) for match, position in matches if match.item is None]
+        if not unmatched or self.ocr_fallback is None or self.matcher is None:
+            return
+        found = {match.item.display_name for match, _ in matches if match.item is not None}
+        candidates = [
+            (line, resolved)
+            for line in await self.ocr_fallback(image)
+            for resolved in self.matcher.resolve(line.text)
+            if resolved.item is not None and resolved.item.display_name not in found
+        ]
+
+        pairs = sorted(
+            (
+                float(np.hypot(*np.subtract(self.grid.center(position), line.center))),
+                slot_index,
+                line_index,
+            )
+            for slot_index, (_, position) in enumerate(unmatched)
+            for line_index, (line, _) in enumerate(candidates)
+        )
+        paired_slots: set[int] = set()
+        paired_lines: set[int] = set()
+        for distance, slot_index, line_index in pairs:
+            if distance > self.grid.pitch:
+                break
+            if slot_index in paired_slots or line_index in paired_lines:
+                continue
+            paired_slots.add(slot_index)
+            paired_lines.add(line_index)
+            match, resolved = unmatched[slot_index][0], candidates[line_index][1]
+            match.item = resolved.item
+            match.quantity = resolved.quantity
+            match.score = resolved.confidence
+
+    async def recognize(self, image: MatLike) -> list[SlotMatch]:
+        array = np.asarray(image)
+        slots = [
+            (index, position, slot)
+            for index, (position, slot) in enumerate(
+                zip(self.grid.positions(array), self.grid.slots(array)),
+            )
+            if float(to_gray(slot).std()) > self.empty_slot_deviation
+        ]
+        if not slots:
+            return []
+
+        matches = [
+            (SlotMatch(slot=index, item=None, quantity=1, score=0.0), position)
+            for index, position, _ in slots
+        ]
+        if len(self.atlas):
+            best, scores = self.atlas.match([slot for _, _, slot in slots])
+            quantity_reads: list[tuple[SlotMatch, Awaitable[int]]] = []
+            for (match, _), (_, _, slot), position, score in zip(matches, slots, best, scores):
+                match.score = round(float(score), 4)
+                if score >= self.min_score:
+                    match.item = self.catalog.get_by_display_name(self.atlas.names[position])
+                if match.item is not None and match.item.itemquantity.maxquantity > 1:
+                    quantity_reads.append((match, self._read_quantity(slot)))
+
+            quantities = await asyncio.gather(*[read for _, read in quantity_reads])
+            for (match, _), quantity in zip(quantity_reads, quantities):
+                match.quantity = quantity
+        await self._resolve_unmatched(image, matches)
+        return [match for match, _ in matches]
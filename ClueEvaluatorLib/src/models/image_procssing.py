@@ -3,11 +3,18 @@ from __future__ import annotations
 import mss.windows
 
 try:
-    from ClueEvaluatorLib.src.models.base import ScreenSection
+    from ClueEvaluatorLib.src.models.base import Configuration, ScreenSection
+    from ClueEvaluatorLib.src.models.icons import IconRecognizer
+    from ClueEvaluatorLib.src.models.ocr import OCRLine, OCRResultCache, OCRWorkerPool
+    from ClueEvaluatorLib.src.models.preprocessing import RGB, Gray, PreprocessingPipeline, Threshold
 except:  # noqa: E722
-    from base import ScreenSection  # type: ignore[no-redef]
+    from base import Configuration, ScreenSection  # type: ignore[no-redef]
+    from icons import IconRecognizer  # type: ignore[no-redef]
+    from ocr import OCRLine, OCRResultCache, OCRWorkerPool  # type: ignore[no-redef]
+    from preprocessing import RGB, Gray, PreprocessingPipeline, Threshold  # type: ignore[no-redef]
 
-from typing import Any
+import asyncio
+from typing import Any, Optional
 
 import cv2
 import mss.tools
@@ -22,39 +29,99 @@ class ImageRecongition:
     tesseract_config: str = r"--oem 3 --psm 6"
     mss_context: mss.windows.MSS = mss.mss()
 
-    async def _set_image_threshold(self, image: MatLike, thresh: float, max: float, type: int) -> None:
-        _, thresh_image = cv2.threshold(image, thresh, max, type)
-        image = thresh_image
-
-    async def _image_encoding(self, image: np.ndarray, code: int) -> MatLike:
-        return cv2.cvtColor(image, code=code)
-
-    async def _rgb_image(self, image: np.ndarray) -> None:
-        image = await self._image_encoding(image, cv2.COLOR_BGR2RGB)
-
-    async def _grayscale_image(self, image: np.ndarray) -> None:
-        image = await self._image_encoding(image, cv2.COLOR_BGR2GRAY)
+    def __init__(
+        self,
+        ocr_pool: Optional[OCRWorkerPool] = None,
+        ocr_workers: int = 2,
+        ocr_cache: Optional[OCRResultCache] = None,
+        value_pipeline: Optional[PreprocessingPipeline] = None,
+        items_pipeline: Optional[PreprocessingPipeline] = None,
+        icon_recognizer: Optional[IconRecognizer] = None,
+    ):
+        self.ocr_pool: OCRWorkerPool = ocr_pool or OCRWorkerPool(
+            size=ocr_workers,
+            tesseract_config=self.tesseract_config,
+        )
+        self.ocr_cache: OCRResultCache = ocr_cache or OCRResultCache()
+        self.value_pipeline: PreprocessingPipeline = value_pipeline or PreprocessingPipeline(
+            RGB(),
+            Threshold(150, 255, cv2.THRESH_BINARY),
+        )
+        self.items_pipeline: PreprocessingPipeline = items_pipeline or PreprocessingPipeline(
+            Gray(),
+            Threshold(150, 255, cv2.THRESH_BINARY),
+        )
+        # Reward items are matched by icon first, unmatched slots go through OCR.
+        self.icon_recognizer = icon_recognizer
+        if icon_recognizer is not None:
+            icon_recognizer.ocr_pool = icon_recognizer.ocr_pool or self.ocr_pool
+            icon_recognizer.ocr_fallback = (
+                icon_recognizer.ocr_fallback or self.recognize_reward_item_lines
+            )
+
+    @classmethod
+    def from_configuration(
+        cls, config: Configuration, icon_recognizer: Optional[IconRecognizer] = None
+    ) -> ImageRecongition:
+        """Sizes the OCR workers and result cache from the ``[ImageProcessing]`` settings."""
+        return cls(
+            ocr_workers=config.ocr_workers,
+            ocr_cache=OCRResultCache(capacity=config.ocr_cache_size, path=config.ocr_cache_file),
+            icon_recognizer=icon_recognizer,
+        )
 
     async def _get_text(self, image: MatLike) -> Any:
-        return pytesseract.image_to_string(image, config=self.tesseract_config)
+        return await self.ocr_pool.submit(image)
 
     async def _mss_get_image(self, image_params: ScreenSection) -> np.ndarray:
         with self.mss_context as context:
-            return np.array(context.grab(image_params.mss_monitor_dict()))
+            screenshot = context.grab(image_params.mss_monitor_dict())
+        # View on the BGRA grab buffer instead of copying it.
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(
+            screenshot.height, screenshot.width, 4
+        )
 
     async def _process_image(self, image: MatLike) -> Any:
-        await self._set_image_threshold(image, 150, 255, cv2.THRESH_BINARY)
-        return await self._get_text(image)
+        key = self.ocr_cache.make_key(image, self.tesseract_config)
+        text = self.ocr_cache.get(key)
+        if text is None:
+            # Pipeline buffers are reused by the next run, the workers get their own copy.
+            text = await self._get_text(np.array(image, copy=True))
+            self.ocr_cache.put(key, text)
+        return text
+
+    async def recognize_reward_value(self, image: MatLike) -> str:
+        return await self._process_image(self.value_pipeline.run(image))
+
+    async def recognize_reward_item_lines(self, image: MatLike) -> list[OCRLine]:
+        return await self.ocr_pool.submit_lines(np.array(self.items_pipeline.run(image), copy=True))
+
+    async def recognize_reward_items(self, image: MatLike) -> str:
+        if self.icon_recognizer is not None:
+            matches = await self.icon_recognizer.recognize(image)
+            lines = [f"{match.quantity} x {match.item.display_name}" for match in matches if match.item]
+            if lines:
+                return "\n".join(lines)
+        return await self._process_image(self.items_pipeline.run(image))
 
     async def get_clue_reward_value(self, image_params: ScreenSection) -> str:
-        image: MatLike = await self._mss_get_image(image_params)
-        await self._rgb_image(image)
-        return await self._process_image(image)
+        return await self.recognize_reward_value(await self._mss_get_image(image_params))
 
     async def get_clue_reward_items(self, image_params: ScreenSection) -> str:
-        image: MatLike = await self._mss_get_image(image_params)
-        await self._grayscale_image(image)
-        return await self._process_image(image)
+        return await self.recognize_reward_items(await self._mss_get_image(image_params))
+
+    async def get_clue_rewards(
+        self, value_params: ScreenSection, items_params: ScreenSection
+    ) -> tuple[str, str]:
+        value, items = await asyncio.gather(
+            self.get_clue_reward_value(value_params),
+            self.get_clue_reward_items(items_params),
+        )
+        return value, items
+
+    def close(self) -> None:
+        self.ocr_pool.close()
+        self.ocr_cache.close()
 
 
 async def _main() -> None:
@@ -68,7 +135,9 @@ async def _main() -> None:
         height=24,
     )
 
-    recognizer = ImageRecongition()
+    recognizer = ImageRecongition.from_configuration(
+        Configuration.load("C:\\Development\\RS3\\ClueEvaluator\\ClueEvaluatorLib\\data\\config.ini"),
+    )
     out = await recognizer.get_clue_reward_value(screensec)
     end = datetime.now()
     print(out)
@@ -79,8 +148,6 @@ async def _main() -> None:
 
 
 if __name__ == "__main__":
-    import asyncio
-
     loop = asyncio.get_event_loop()
     asyncio.ensure_future(_main())
     loop.run_forever()
@@ -2,41 +2,107 @@ from __future__ import annotations
 
 try:
     from ClueEvaluatorLib.src.models.base import DBBaseModel
+    from ClueEvaluatorLib.src.models.pricing import PriceFetcher, PriceFetchError
 except:  # noqa: E722
     from base import DBBaseModel  # type: ignore[no-redef]
+    from pricing import PriceFetcher, PriceFetchError  # type: ignore[no-redef]
 
 import pickle
-from typing import Any, Optional
+from fractions import Fraction
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, ClassVar, Optional
 
-import requests
-from pydantic import BaseModel
+from pydantic import ConfigDict, model_validator
+
+if TYPE_CHECKING:
+    from sqlalchemy import RowMapping
+
+
+def make_internal_name(display_name: str) -> str:
+    return (
+        display_name.replace(
+            " ",
+            "_",
+        )
+        .lower()
+        .capitalize()
+    )
+
+
+def encode_dropsources(sources: Optional[list[DropSources]]) -> Optional[str]:
+    if not sources:
+        return None
+    return "-".join(f"{source.name}@{source.rate}" for source in sources)
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate: str) -> float:
+    """Decimal value of a drop rate like ``1/128`` or ``0.25``, parsed without ``eval``."""
+    return round(float(Fraction(rate.strip())), 9)
 
 
 class ItemQuantity(DBBaseModel):
+    """Quantity range shared by many items, ``intern`` returns one frozen instance per range."""
+
+    model_config = ConfigDict(frozen=True)
+    identity_columns: ClassVar[tuple[str, ...]] = ("minquantity", "maxquantity")
+    _instances: ClassVar[dict[tuple[int, int], ItemQuantity]] = {}
     minquantity: int
     maxquantity: int
 
-    async def as_db_item(self, db_model: DBBaseModel) -> type[ItemQuantity]:
-        return db_model(
-            minquantity=self.minquantity,
-            maxquantity=self.maxquantity,
-        )
+    @classmethod
+    def intern(cls, minquantity: int, maxquantity: int) -> ItemQuantity:
+        key = (minquantity, maxquantity)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls._instances.setdefault(
+                key, cls(minquantity=minquantity, maxquantity=maxquantity)
+            )
+        return instance
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (ItemQuantity.intern, (self.minquantity, self.maxquantity))
+
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "minquantity": self.minquantity,
+            "maxquantity": self.maxquantity,
+        }
 
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        return f"SELECT * FROM itemquantity WHERE minquantity == {self.minquantity} AND maxquantity == {self.maxquantity}"
+    def identity(self) -> tuple[Any, ...]:
+        return (self.minquantity, self.maxquantity)
 
 
 class DropSources(DBBaseModel):
+    """Drop source shared by many items, ``intern`` returns one frozen instance per source."""
+
+    model_config = ConfigDict(frozen=True)
+    identity_columns: ClassVar[tuple[str, ...]] = ("name", "rate")
+    _instances: ClassVar[dict[tuple[str, str], DropSources]] = {}
     name: str
     rate: str
     decimal_rate: Optional[float] = None
 
-    def model_post_init(self, __context: Any) -> None:
-        self._make_decimal_rate()
-        super().model_post_init(__context)
+    @model_validator(mode="before")
+    @classmethod
+    def _make_decimal_rate(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("decimal_rate") is None and "rate" in data:
+            data = {**data, "decimal_rate": parse_rate(str(data["rate"]))}
+        return data
+
+    @classmethod
+    def intern(cls, name: str, rate: str) -> DropSources:
+        key = (name, rate)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls._instances.setdefault(key, cls(name=name, rate=rate))
+        return instance
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        return (DropSources.intern, (self.name, self.rate))
 
     def __str__(self) -> str:
         return f'DropSource(name="{self.name}", rate={self.rate})'
@@ -44,50 +110,82 @@ class DropSources(DBBaseModel):
     def __repr__(self) -> str:
         return self.__str__()
 
-    async def as_db_item(self, db_model: BaseModel) -> type[DropSources]:
-        return db_model(
-            name=self.name,
-            rate=self.rate,
-            decimal_rate=self.decimal_rate,
-        )
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "rate": self.rate,
+            "decimal_rate": self.decimal_rate,
+        }
 
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        return f"SELECT * FROM dropsources WHERE name == '{self.name}' AND rate == '{self.rate}'"
-
-    def _make_decimal_rate(self) -> None:
-        self.decimal_rate = round(float(eval(self.rate)), 9)  #
+    def identity(self) -> tuple[Any, ...]:
+        return (self.name, self.rate)
 
 
 class ItemModifiers(DBBaseModel):
+    identity_columns: ClassVar[tuple[str, ...]] = ("minquantity", "maxquantity", "dropsources")
     itemquantity: Optional[ItemQuantity]
     dropsources: Optional[list[DropSources]]
 
-    async def as_db_item(self, db_model: BaseModel) -> type[ItemModifiers]:
-        return db_model(
-            itemquantity=self.itemquantity.serialize() if self.itemquantity else None,
-            dropsources=(
-                pickle.dumps([source.serialize() for source in self.dropsources])
-                if self.dropsources
-                else None
-            ),
+    @classmethod
+    def db_fields(cls) -> dict[str, tuple[Any, Any]]:
+        return {
+            "minquantity": (Optional[int], None),
+            "maxquantity": (Optional[int], None),
+            "dropsources": (Optional[str], None),
+        }
+
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "minquantity": self.itemquantity.minquantity if self.itemquantity else None,
+            "maxquantity": self.itemquantity.maxquantity if self.itemquantity else None,
+            "dropsources": encode_dropsources(self.dropsources),
+        }
+
+    def serialize(self) -> bytes:
+        return pickle.dumps(self)
+
+    def identity(self) -> tuple[Any, ...]:
+        return (
+            self.itemquantity.minquantity if self.itemquantity else None,
+            self.itemquantity.maxquantity if self.itemquantity else None,
+            encode_dropsources(self.dropsources),
         )
 
+
+class ItemDropSource(DBBaseModel):
+    """Relation row linking an item to one of its (modifier) drop sources."""
+
+    identity_columns: ClassVar[tuple[str, ...]] = ("item_name", "name", "rate", "modifier")
+    item_name: str
+    name: str
+    rate: str
+    decimal_rate: Optional[float] = None
+    modifier: bool = False
+
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "item_name": self.item_name,
+            "name": self.name,
+            "rate": self.rate,
+            "decimal_rate": self.decimal_rate,
+            "modifier": self.modifier,
+        }
+
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        itemquantity_bstr: str = ""
-        if not self.itemquantity:
-            raise ValueError("Cannot build filter statement with 'itemquantity = None'")
-        else:
-            itemquantity_bstr = str(pickle.dumps(self.itemquantity.serialize()))
-        return f"SELECT * FROM itemmodifiers WHERE itemquantity == {itemquantity_bstr}"
+    def identity(self) -> tuple[Any, ...]:
+        return (self.item_name, self.name, self.rate, self.modifier)
+
+    def as_dropsource(self) -> DropSources:
+        return DropSources.intern(self.name, self.rate)
 
 
 class Item(DBBaseModel):
+    identity_columns: ClassVar[tuple[str, ...]] = ("display_name",)
     display_name: str
     internal_name: Optional[str] = None
     itemquantity: ItemQuantity
@@ -102,59 +200,143 @@ class Item(DBBaseModel):
     category: str
 
     async def make_internal_name(self) -> None:
-        self.internal_name = (
-            self.display_name.replace(
-                " ",
-                "_",
-            )
-            .lower()
-            .capitalize()
-        )
+        self.internal_name = make_internal_name(self.display_name)
 
-    async def get_price_from_wiki(self, update_price: bool = True) -> None:
+    async def get_price_from_wiki(
+        self, update_price: bool = True, fetcher: Optional[PriceFetcher] = None
+    ) -> Optional[int]:
         if self.internal_name is None:
             await self.make_internal_name()
-        dummy_internal_name = "Armadyl_page_1"
-        request = requests.get(
-            f"https://www.runescape.wiki/w/Exchange:{dummy_internal_name}",
-        )
-        # request = requests.get(f"https://www.runescape.wiki/w/Exchange:{self.internal_name}")
-        _price = int(
-            str(request.content).split('id="GEPrice">')[1].split("<", 1)[0].replace(",", ""),
-        )
-        if update_price:
+        try:
+            if fetcher is None:
+                async with PriceFetcher() as fetcher:
+                    _price = await fetcher.fetch_price(str(self.internal_name))
+            else:
+                _price = await fetcher.fetch_price(str(self.internal_name))
+        except PriceFetchError as error:
+            print(error)
+            return None
+        if update_price and _price is not None:
             self.price = _price
+        return _price
 
     def get_image_url(self) -> str:
         return f"https://runescape.wiki/images/{self.internal_name}.png?{self.image_id}"
 
-    async def model_post_init(self, __context: Any) -> None:
-        await self.make_internal_name()
-        await self.get_price_from_wiki(update_price=self.price is None)
-        await super().model_post_init(__context)
-
-    async def as_db_item(self, db_model: BaseModel) -> BaseModel:
-        return db_model(
-            display_name=self.display_name,
-            internal_name=self.internal_name,
-            itemquantity=self.itemquantity.serialize(),
-            is_unique=self.is_unique,
-            is_broadcast=self.is_broadcast,
-            noted=self.noted,
-            dropsources=(
-                pickle.dumps([source.serialize() for source in self.dropsources])
-                if self.dropsources
-                else None
-            ),
-            droptable=self.droptable,
-            price=self.price,
-            itemmodifiers=(pickle.dumps(self.itemmodifiers.serialize()) if self.itemmodifiers else None),
-            image_id=self.image_id,
-            category=self.category,
+    def model_post_init(self, __context: Any) -> None:
+        if self.internal_name is None:
+            self.internal_name = make_internal_name(self.display_name)
+        super().model_post_init(__context)
+
+    @classmethod
+    def db_fields(cls) -> dict[str, tuple[Any, Any]]:
+        return {
+            "display_name": (str, ...),
+            "internal_name": (Optional[str], None),
+            "minquantity": (int, ...),
+            "maxquantity": (int, ...),
+            "is_unique": (bool, ...),
+            "is_broadcast": (bool, ...),
+            "noted": (bool, ...),
+            "droptable": (str, ...),
+            "price": (Optional[int], None),
+            "modifier_minquantity": (Optional[int], None),
+            "modifier_maxquantity": (Optional[int], None),
+            "image_id": (int, ...),
+            "category": (str, ...),
+        }
+
+    @classmethod
+    def from_db(cls, row: RowMapping, sources: list[ItemDropSource]) -> Item:
+        modifier_sources = [source.as_dropsource() for source in sources if source.modifier]
+        itemmodifiers: Optional[ItemModifiers] = None
+        if row["modifier_minquantity"] is not None or modifier_sources:
+            itemmodifiers = ItemModifiers(
+                itemquantity=(
+                    ItemQuantity.intern(row["modifier_minquantity"], row["modifier_maxquantity"])
+                    if row["modifier_minquantity"] is not None
+                    else None
+                ),
+                dropsources=modifier_sources or None,
+            )
+        return cls(
+            display_name=row["display_name"],
+            internal_name=row["internal_name"],
+            itemquantity=ItemQuantity.intern(row["minquantity"], row["maxquantity"]),
+            is_unique=bool(row["is_unique"]),
+            is_broadcast=bool(row["is_broadcast"]),
+            noted=bool(row["noted"]),
+            dropsources=[source.as_dropsource() for source in sources if not source.modifier],
+            droptable=row["droptable"],
+            price=row["price"],
+            itemmodifiers=itemmodifiers,
+            image_id=row["image_id"],
+            category=row["category"],
         )
 
+    def db_relations(self) -> list[ItemDropSource]:
+        relations = [
+            ItemDropSource(
+                item_name=self.display_name,
+                name=source.name,
+                rate=source.rate,
+                decimal_rate=source.decimal_rate,
+            )
+            for source in self.dropsources
+        ]
+        if self.itemmodifiers and self.itemmodifiers.dropsources:
+            relations.extend(
+                ItemDropSource(
+                    item_name=self.display_name,
+                    name=source.name,
+                    rate=source.rate,
+                    decimal_rate=source.decimal_rate,
+                    modifier=True,
+                )
+                for source in self.itemmodifiers.dropsources
+            )
+        return relations
+
+    def as_db_row(self) -> dict[str, Any]:
+        modifier_quantity = self.itemmodifiers.itemquantity if self.itemmodifiers else None
+        return {
+            "display_name": self.display_name,
+            "internal_name": self.internal_name,
+            "minquantity": self.itemquantity.minquantity,
+            "maxquantity": self.itemquantity.maxquantity,
+            "is_unique": self.is_unique,
+            "is_broadcast": self.is_broadcast,
+            "noted": self.noted,
+            "droptable": self.droptable,
+            "price": self.price,
+            "modifier_minquantity": modifier_quantity.minquantity if modifier_quantity else None,
+            "modifier_maxquantity": modifier_quantity.maxquantity if modifier_quantity else None,
+            "image_id": self.image_id,
+            "category": self.category,
+        }
+
+    def serialize(self) -> bytes:
+        return pickle.dumps(self)
+
+    def identity(self) -> tuple[Any, ...]:
+        return (self.display_name,)
+
+
+class CatalogRow(DBBaseModel):
+    """Fingerprint of the CSV row an item was parsed from, used to sync catalog edits."""
+
+    identity_columns: ClassVar[tuple[str, ...]] = ("display_name",)
+    display_name: str
+    fingerprint: str
+
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "display_name": self.display_name,
+            "fingerprint": self.fingerprint,
+        }
+
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        return f"SELECT * FROM item WHERE display_name == '{self.display_name}'"
+    def identity(self) -> tuple[Any, ...]:
+        return (self.display_name,)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import re
+from difflib import SequenceMatcher
+from typing import Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.catalog import CatalogIndex
+    from ClueEvaluatorLib.src.models.items import Item
+except:  # noqa: E722
+    from catalog import CatalogIndex  # type: ignore[no-redef]
+    from items import Item  # type: ignore[no-redef]
+
+NON_ALPHANUMERIC = re.compile(r"[^a-z0-9 ]+")
+WHITESPACE = re.compile(r"\s+")
+QUANTITY_PATTERNS = (
+    re.compile(r"^(?P<quantity>\d[\d,.]*\s*[km]?)\s*[x×*]?\s+(?P<name>.*[a-z].*)$", re.IGNORECASE),
+    re.compile(
+        r"^(?P<name>.*[a-z].*?)\s*(?:[x×*]\s*|\()(?P<quantity>\d[\d,.]*\s*[km]?)\)?$", re.IGNORECASE
+    ),
+)
+QUANTITY_SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def normalize_text(text: str) -> str:
+    return WHITESPACE.sub(" ", NON_ALPHANUMERIC.sub(" ", text.lower())).strip()
+
+
+def trigrams(text: str) -> set[str]:
+    padded = f"  {normalize_text(text)} "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def parse_quantity(text: str) -> Optional[int]:
+    text = text.lower().replace(",", "").replace(" ", "")
+    multiplier = 1
+    if text and text[-1] in QUANTITY_SUFFIXES:
+        multiplier = QUANTITY_SUFFIXES[text[-1]]
+        text = text[:-1]
+    try:
+        return int(float(text) * multiplier)
+    except ValueError:
+        return None
+
+
+def split_quantity(line: str) -> tuple[str, int]:
+    line = line.strip()
+    for pattern in QUANTITY_PATTERNS:
+        match = pattern.match(line)
+        if match:
+            quantity = parse_quantity(match.group("quantity"))
+            if quantity:
+                return match.group("name").strip(), quantity
+    return line, 1
+
+
+class ResolvedItem(BaseModel):
+    text: str
+    item: Optional[Item]
+    quantity: int
+    confidence: float
+
+
+class ResolveRequest(BaseModel):
+    text: str
+    min_confidence: float = 0.5
+
+
+class ItemMatcher:
+    """Maps noisy OCR lines to catalog items through a trigram index.
+
+    Candidate scores are accumulated from the posting lists of the query's
+    trigrams only; the best few candidates are re-ranked by sequence
+    similarity.
+    """
+
+    def __init__(self, catalog: CatalogIndex, rerank: int = 5):
+        self.rerank = rerank
+        self._items: tuple[Item, ...] = catalog.items
+        self._names: list[str] = [normalize_text(item.display_name) for item in self._items]
+        self._sizes = np.zeros(len(self._items), dtype=np.float32)
+
+        postings: dict[str, list[int]] = {}
+        for position, item in enumerate(self._items):
+            grams = trigrams(item.display_name)
+            self._sizes[position] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        self._postings: dict[str, np.ndarray] = {
+            gram: np.asarray(positions, dtype=np.int32) for gram, positions in postings.items()
+        }
+
+    def match(self, text: str) -> tuple[Optional[Item], float]:
+        grams = trigrams(text)
+        hits = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not hits:
+            return None, 0.0
+
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._items))
+        scores = 2 * shared / (len(grams) + self._sizes)
+        count = min(self.rerank, len(scores))
+        candidates = np.argpartition(scores, -count)[-count:]
+
+        normalized = normalize_text(text)
+        best: tuple[Optional[Item], float] = (None, 0.0)
+        for position in candidates:
+            ratio = SequenceMatcher(None, normalized, self._names[position]).ratio()
+            confidence = float((scores[position] + ratio) / 2)
+            if confidence > best[1]:
+                best = (self._items[position], confidence)
+        return best
+
+    def resolve_line(self, line: str) -> ResolvedItem:
+        name, quantity = split_quantity(line)
+        item, confidence = self.match(name)
+        return ResolvedItem(text=line, item=item, quantity=quantity, confidence=round(confidence, 4))
+
+    def resolve(self, text: str, min_confidence: float = 0.5) -> list[ResolvedItem]:
+        resolved: list[ResolvedItem] = []
+        for line in text.splitlines():
+            if len(normalize_text(line).replace(" ", "")) < 3:
+                continue
+            result = self.resolve_line(line)
+            if result.confidence < min_confidence:
+                result.item = None
+            resolved.append(result)
+        return resolved
@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import pickle
+from typing import Awaitable, Callable
+
+from sqlalchemy import RowMapping, text
+
+try:
+    from ClueEvaluatorLib.src.models.base import DBBaseModel
+    from ClueEvaluatorLib.src.models.dbhandler import DataBaseHandler
+    from ClueEvaluatorLib.src.models.items import CatalogRow, Item, ItemDropSource, ItemModifiers
+except:  # noqa: E722
+    from base import DBBaseModel  # type: ignore[no-redef]
+    from dbhandler import DataBaseHandler  # type: ignore[no-redef]
+    from items import CatalogRow, Item, ItemDropSource, ItemModifiers  # type: ignore[no-redef]
+
+PICKLED_TABLES = ("item", "itemmodifiers")
+SCHEMA_VERSION = 3
+
+
+def _decode_pickled_item(row: RowMapping) -> Item:
+    return Item(
+        display_name=row["display_name"],
+        internal_name=row["internal_name"],
+        itemquantity=pickle.loads(row["itemquantity"]),
+        is_unique=bool(row["is_unique"]),
+        is_broadcast=bool(row["is_broadcast"]),
+        noted=bool(row["noted"]),
+        dropsources=[pickle.loads(instance) for instance in pickle.loads(row["dropsources"])],
+        droptable=row["droptable"],
+        price=row["price"],
+        itemmodifiers=pickle.loads(pickle.loads(row["itemmodifiers"])) if row["itemmodifiers"] else None,
+        image_id=row["image_id"],
+        category=row["category"],
+    )
+
+
+def _decode_pickled_modifiers(row: RowMapping) -> ItemModifiers:
+    return ItemModifiers(
+        itemquantity=pickle.loads(row["itemquantity"]) if row["itemquantity"] else None,
+        dropsources=(
+            [pickle.loads(instance) for instance in pickle.loads(row["dropsources"])]
+            if row["dropsources"]
+            else None
+        ),
+    )
+
+
+async def requires_pickle_migration(dbhandler: DataBaseHandler) -> bool:
+    if not await dbhandler.check_table_exists("item"):
+        return False
+    return "itemquantity" in await dbhandler.get_table_columns("item")
+
+
+async def migrate_pickled_items(
+    dbhandler: DataBaseHandler, object_types: list[type[DBBaseModel]]
+) -> bool:
+    """Moves items stored as nested pickles into the normalized item layout.
+
+    The pickled tables are renamed first and only dropped once the items
+    have been written to the new tables, so a failed run can be repeated.
+    Returns whether a migration took place.
+    """
+    if not await requires_pickle_migration(dbhandler):
+        return False
+
+    print("Migrating pickled item storage ...")
+    async with dbhandler.engine.begin() as connection:
+        for table_name in PICKLED_TABLES:
+            if await dbhandler.check_table_exists(table_name):
+                await connection.execute(
+                    text(f"ALTER TABLE {table_name} RENAME TO {table_name}_pickled")
+                )
+        await connection.execute(text("DROP TABLE IF EXISTS itemdropsource"))
+
+    async with dbhandler.engine.connect() as connection:
+        items = [
+            _decode_pickled_item(row)
+            for row in (await connection.execute(text("SELECT * FROM item_pickled"))).mappings()
+        ]
+        modifiers: list[ItemModifiers] = []
+        if await dbhandler.check_table_exists("itemmodifiers_pickled"):
+            modifiers = [
+                _decode_pickled_modifiers(row)
+                for row in (
+                    await connection.execute(text("SELECT * FROM itemmodifiers_pickled"))
+                ).mappings()
+            ]
+
+    await dbhandler.create_tables(object_types)
+    async with dbhandler.bulk_load() as connection:
+        await dbhandler.bulk_add_db_items(connection, ItemModifiers, modifiers)
+        await dbhandler.bulk_add_db_items(connection, Item, items)
+        await dbhandler.bulk_add_db_items(
+            connection,
+            ItemDropSource,
+            [relation for item in items for relation in item.db_relations()],
+        )
+
+    async with dbhandler.engine.begin() as connection:
+        for table_name in PICKLED_TABLES:
+            await connection.execute(text(f"DROP TABLE IF EXISTS {table_name}_pickled"))
+    print(f"Migrated {len(items)} items and {len(modifiers)} modifiers")
+    return True
+
+
+async def _add_identity_indexes(
+    dbhandler: DataBaseHandler, object_types: list[type[DBBaseModel]]
+) -> None:
+    # The latest row of each identity is kept, older statistics rows are stale copies.
+    await dbhandler.remove_duplicate_identities(object_types)
+    await dbhandler.create_tables(object_types)
+
+
+async def _add_catalog_rows(dbhandler: DataBaseHandler, object_types: list[type[DBBaseModel]]) -> None:
+    await dbhandler.create_tables([CatalogRow])
+
+
+async def _add_statistics_total(
+    dbhandler: DataBaseHandler, object_types: list[type[DBBaseModel]]
+) -> None:
+    if "total_value" in await dbhandler.get_table_columns("statistics"):
+        return
+    async with dbhandler.engine.begin() as connection:
+        await connection.execute(
+            text("ALTER TABLE statistics ADD COLUMN total_value INTEGER NOT NULL DEFAULT 0")
+        )
+
+
+# Each step upgrades the schema to its version, steps have to be idempotent.
+MIGRATION_STEPS: list[
+    tuple[int, Callable[[DataBaseHandler, list[type[DBBaseModel]]], Awaitable[None]]]
+] = [
+    (1, _add_identity_indexes),
+    (2, _add_catalog_rows),
+    (3, _add_statistics_total),
+]
+
+
+async def migrate_schema(dbhandler: DataBaseHandler, object_types: list[type[DBBaseModel]]) -> int:
+    """Brings the database to ``SCHEMA_VERSION``, returns the version it had before.
+
+    The version is kept in SQLite's ``user_version``, so a current database
+    is left alone without any reflection. A new database gets the current
+    schema in one go, older ones run the steps after their version.
+    Databases from before versioning report version 0.
+    """
+    version = await dbhandler.get_schema_version()
+    if version == SCHEMA_VERSION:
+        return version
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than the supported version {SCHEMA_VERSION}."
+        )
+
+    if version == 0 and not await dbhandler.check_table_exists("item"):
+        print("Creating database schema")
+        await dbhandler.create_tables(object_types)
+    else:
+        if version == 0:
+            await migrate_pickled_items(dbhandler, object_types)
+        for step_version, step in MIGRATION_STEPS:
+            if step_version > version:
+                print(f"Migrating database schema to version {step_version} ...")
+                await step(dbhandler, object_types)
+    await dbhandler.set_schema_version(SCHEMA_VERSION)
+    return version
+
+
+async def _main(dbfile: str) -> None:
+    from ClueEvaluatorLib.src.fastapi_server import OBJECT_TYPES
+
+    dbhandler = DataBaseHandler(dbfile=dbfile, echo=False, db_object_types=OBJECT_TYPES)
+    version = await migrate_schema(dbhandler, OBJECT_TYPES)
+    print(f"Migrated database schema from version {version} to {SCHEMA_VERSION}.")
+    await dbhandler.close()
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    asyncio.run(_main(sys.argv[1]))
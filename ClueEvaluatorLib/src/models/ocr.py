@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pytesseract
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.cache import LRUCache
+except:  # noqa: E722
+    from cache import LRUCache  # type: ignore[no-redef]
+
+try:
+    import tesserocr
+except ImportError:  # pragma: no cover - listed in requirements-optional.txt, needs tesseract headers
+    tesserocr = None
+
+DEFAULT_TESSERACT_CONFIG = r"--oem 3 --psm 6"
+
+
+def parse_tesseract_config(config: str) -> dict[str, int]:
+    return {name: int(value) for name, value in re.findall(r"--(oem|psm)\s+(\d+)", config)}
+
+
+class OCRLine(BaseModel):
+    """One recognized text line and its bounding box in image coordinates."""
+
+    text: str
+    left: int
+    top: int
+    width: int
+    height: int
+
+    @property
+    def center(self) -> tuple[float, float]:
+        return self.left + self.width / 2, self.top + self.height / 2
+
+
+class OCREngine:
+    """Recognizes the text of a single image buffer."""
+
+    def recognize(self, image: np.ndarray) -> str:
+        raise NotImplementedError()
+
+    def recognize_lines(self, image: np.ndarray) -> list[OCRLine]:
+        raise NotImplementedError()
+
+    def close(self) -> None:
+        pass
+
+
+class PytesseractEngine(OCREngine):
+    """Fallback engine spawning the tesseract executable for every image."""
+
+    def __init__(self, config: str = DEFAULT_TESSERACT_CONFIG):
+        self.config = config
+
+    def recognize(self, image: np.ndarray) -> str:
+        return str(pytesseract.image_to_string(image, config=self.config))
+
+    def recognize_lines(self, image: np.ndarray) -> list[OCRLine]:
+        data = pytesseract.image_to_data(image, config=self.config, output_type=pytesseract.Output.DICT)
+        words: dict[tuple[int, int, int], list[int]] = {}
+        for index, word in enumerate(data["text"]):
+            if str(word).strip():
+                line = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+                words.setdefault(line, []).append(index)
+
+        lines = []
+        for indices in words.values():
+            left = min(data["left"][index] for index in indices)
+            top = min(data["top"][index] for index in indices)
+            right = max(data["left"][index] + data["width"][index] for index in indices)
+            bottom = max(data["top"][index] + data["height"][index] for index in indices)
+            lines.append(
+                OCRLine(
+                    text=" ".join(str(data["text"][index]).strip() for index in indices),
+                    left=left,
+                    top=top,
+                    width=right - left,
+                    height=bottom - top,
+                ),
+            )
+        return lines
+
+
+class TesserocrEngine(OCREngine):
+    """Keeps one initialized tesseract API, fed with raw image buffers."""
+
+    def __init__(self, config: str = DEFAULT_TESSERACT_CONFIG, lang: str = "eng"):
+        if tesserocr is None:
+            raise RuntimeError("TesserocrEngine requires the optional 'tesserocr' package.")
+        options = parse_tesseract_config(config)
+        self.api = tesserocr.PyTessBaseAPI(
+            lang=lang,
+            psm=options.get("psm", tesserocr.PSM.AUTO),
+            oem=options.get("oem", tesserocr.OEM.DEFAULT),
+        )
+
+    def _set_image(self, image: np.ndarray) -> None:
+        image = np.ascontiguousarray(image)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        self.api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, image.strides[0])
+
+    def recognize(self, image: np.ndarray) -> str:
+        self._set_image(image)
+        return str(self.api.GetUTF8Text())
+
+    def recognize_lines(self, image: np.ndarray) -> list[OCRLine]:
+        assert tesserocr is not None
+        self._set_image(image)
+        self.api.Recognize()
+        level = tesserocr.RIL.TEXTLINE
+        lines = []
+        for line in tesserocr.iterate_level(self.api.GetIterator(), level):
+            text, box = line.GetUTF8Text(level), line.BoundingBox(level)
+            if text and text.strip() and box:
+                left, top, right, bottom = box
+                lines.append(
+                    OCRLine(
+                        text=text.strip(), left=left, top=top, width=right - left, height=bottom - top
+                    ),
+                )
+        return lines
+
+    def close(self) -> None:
+        self.api.End()
+
+
+def default_engine_factory(config: str = DEFAULT_TESSERACT_CONFIG) -> Callable[[], OCREngine]:
+    if tesserocr is not None:
+        return lambda: TesserocrEngine(config=config)
+    print(
+        "Warning: 'tesserocr' is not installed, falling back to pytesseract, "
+        "which starts a tesseract process for every image. "
+        "Install tesserocr (see requirements-optional.txt) for faster recognition."
+    )
+    return lambda: PytesseractEngine(config=config)
+
+
+class OCRWorkerPool:
+    """Pool of long-lived OCR workers, each owning one engine instance.
+
+    Recognition runs on worker threads, so independent regions can be
+    recognized in parallel without blocking the event loop.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        engine_factory: Optional[Callable[[], OCREngine]] = None,
+        tesseract_config: str = DEFAULT_TESSERACT_CONFIG,
+    ):
+        if size <= 0:
+            raise ValueError("Required arg 'size' must be positive.")
+        self.size = size
+        self.tesseract_config = tesseract_config
+        self._engine_factory = engine_factory or default_engine_factory(tesseract_config)
+        self._local = threading.local()
+        self._engines: list[OCREngine] = []
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=size,
+            thread_name_prefix="ocr-worker",
+            initializer=self._start_worker,
+        )
+
+    def _start_worker(self) -> None:
+        engine = self._engine_factory()
+        self._local.engine = engine
+        with self._lock:
+            self._engines.append(engine)
+
+    def _recognize(self, image: np.ndarray) -> str:
+        return str(self._local.engine.recognize(image))
+
+    def _recognize_lines(self, image: np.ndarray) -> list[OCRLine]:
+        return list(self._local.engine.recognize_lines(image))
+
+    async def submit(self, image: np.ndarray) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._recognize, image)
+
+    async def submit_lines(self, image: np.ndarray) -> list[OCRLine]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._recognize_lines, image)
+
+    async def submit_many(self, images: Iterable[np.ndarray]) -> list[str]:
+        return list(await asyncio.gather(*[self.submit(image) for image in images]))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            for engine in self._engines:
+                engine.close()
+            self._engines.clear()
+
+
+class OCRCacheStats(BaseModel):  # type: ignore
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"memory_hits={self.memory_hits} disk_hits={self.disk_hits} "
+            f"misses={self.misses} hit_rate={self.hit_rate():.1%}"
+        )
+
+
+class OCRResultCache:
+    """Content-addressed cache of recognized text.
+
+    Keys hash the preprocessed pixels together with their shape and the
+    tesseract configuration. Results live in a bounded in-memory LRU tier
+    and, if ``path`` is given, in an SQLite file surviving restarts.
+    """
+
+    def __init__(self, capacity: int = 256, path: Optional[str] = None):
+        self.memory: LRUCache[str, str] = LRUCache(capacity)
+        self.stats = OCRCacheStats()
+        self._disk: Optional[sqlite3.Connection] = None
+        if path is not None:
+            self._disk = sqlite3.connect(path, check_same_thread=False)
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS ocrresult (key TEXT PRIMARY KEY, text TEXT NOT NULL)"
+            )
+            self._disk.commit()
+
+    @staticmethod
+    def make_key(image: np.ndarray, config: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.shape}|{image.dtype}|{config}".encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        text = self.memory.get(key)
+        if text is not None:
+            self.stats.memory_hits += 1
+            return text
+        if self._disk is not None:
+            row = self._disk.execute("SELECT text FROM ocrresult WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self.stats.disk_hits += 1
+                self.memory.put(key, row[0])
+                return str(row[0])
+        self.stats.misses += 1
+        return None
+
+    def put(self, key: str, text: str) -> None:
+        self.memory.put(key, text)
+        if self._disk is not None:
+            self._disk.execute("INSERT OR REPLACE INTO ocrresult (key, text) VALUES (?, ?)", (key, text))
+            self._disk.commit()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
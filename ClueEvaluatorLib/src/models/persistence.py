@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Optional
+
+try:
+    from ClueEvaluatorLib.src.models.dbhandler import DataBaseHandler
+    from ClueEvaluatorLib.src.models.statistics import Statistics
+except:  # noqa: E722
+    from statistics import Statistics  # type: ignore[no-redef,attr-defined]
+
+    from dbhandler import DataBaseHandler  # type: ignore[no-redef]
+
+
+class StatisticsWriter:
+    """Write-behind buffer persisting player statistics in batches.
+
+    Recorded statistics only mark their player as dirty. Dirty players are
+    written in one transaction every ``flush_interval`` seconds, or as soon
+    as ``max_pending`` updates are waiting, so recording never waits on a
+    commit. Repeated updates of the same player collapse into one row.
+    """
+
+    def __init__(self, dbhandler: DataBaseHandler, flush_interval: float = 5.0, max_pending: int = 50):
+        self.dbhandler = dbhandler
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.pending = 0
+        self._dirty: dict[str, Statistics] = {}
+        self._flush_requested = asyncio.Event()
+        self._flusher: Optional[asyncio.Task[None]] = None
+        self._lock = asyncio.Lock()
+
+    def mark_dirty(self, stats: Statistics) -> None:
+        self._dirty[stats.player_name] = stats
+        self.pending += 1
+        if self.pending >= self.max_pending:
+            self._flush_requested.set()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            if not self._dirty:
+                return 0
+            dirty, self._dirty, pending = self._dirty, {}, self.pending
+            self.pending = 0
+            try:
+                # Copies keep the written rows consistent while recording continues.
+                return await self.dbhandler.save_player_stats(
+                    [stats.model_copy() for stats in dirty.values()],
+                )
+            except Exception:
+                for name, stats in dirty.items():
+                    self._dirty.setdefault(name, stats)
+                self.pending += pending
+                raise
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            try:
+                await self.flush()
+            except Exception as error:
+                print(f"Writing player statistics failed: {error!r}")
+
+    async def start(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
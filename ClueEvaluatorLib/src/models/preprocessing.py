@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from typing import Optional
+
+import cv2
+import numpy as np
+
+Shape = tuple[int, ...]
+
+
+class PipelineStage:
+    """One preprocessing step writing its result into a caller provided buffer.
+
+    Stages returning ``None`` from ``output_shape`` produce views of their
+    input and need no buffer.
+    """
+
+    def output_shape(self, shape: Shape) -> Optional[Shape]:
+        raise NotImplementedError()
+
+    def apply(self, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        raise NotImplementedError()
+
+
+class Crop(PipelineStage):
+    def __init__(self, top: int, left: int, height: int, width: int):
+        self.top = top
+        self.left = left
+        self.height = height
+        self.width = width
+
+    def output_shape(self, shape: Shape) -> Optional[Shape]:
+        return None
+
+    def apply(self, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        return image[self.top : self.top + self.height, self.left : self.left + self.width]
+
+
+class _ColorConversion(PipelineStage):
+    codes: dict[int, int] = {}
+    channels: int = 0
+
+    def output_shape(self, shape: Shape) -> Optional[Shape]:
+        if self.channels == 1:
+            return shape[:2]
+        return (*shape[:2], self.channels)
+
+    def apply(self, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        input_channels = 1 if image.ndim == 2 else image.shape[2]
+        return cv2.cvtColor(image, self.codes[input_channels], dst=out)
+
+
+class Gray(_ColorConversion):
+    codes = {3: cv2.COLOR_BGR2GRAY, 4: cv2.COLOR_BGRA2GRAY}
+    channels = 1
+
+
+class RGB(_ColorConversion):
+    codes = {3: cv2.COLOR_BGR2RGB, 4: cv2.COLOR_BGRA2RGB}
+    channels = 3
+
+
+class Threshold(PipelineStage):
+    def __init__(self, thresh: float = 150, maxval: float = 255, type: int = cv2.THRESH_BINARY):
+        self.thresh = thresh
+        self.maxval = maxval
+        self.type = type
+
+    def output_shape(self, shape: Shape) -> Optional[Shape]:
+        return shape
+
+    def apply(self, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        _, result = cv2.threshold(image, self.thresh, self.maxval, self.type, dst=out)
+        return result
+
+
+class Upscale(PipelineStage):
+    def __init__(self, factor: int = 2, interpolation: int = cv2.INTER_CUBIC):
+        self.factor = factor
+        self.interpolation = interpolation
+
+    def output_shape(self, shape: Shape) -> Optional[Shape]:
+        return (shape[0] * self.factor, shape[1] * self.factor, *shape[2:])
+
+    def apply(self, image: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        height, width = image.shape[:2]
+        return cv2.resize(
+            image,
+            (width * self.factor, height * self.factor),
+            dst=out,
+            interpolation=self.interpolation,
+        )
+
+
+class PreprocessingPipeline:
+    """Chains preprocessing stages over buffers allocated once per input shape.
+
+    The returned array is owned by the pipeline and only valid until the
+    next run with an input of the same shape.
+    """
+
+    def __init__(self, *stages: PipelineStage):
+        self.stages = stages
+        self._buffers: dict[tuple[int, Shape], np.ndarray] = {}
+
+    def _buffer(self, index: int, shape: Shape, dtype: np.dtype) -> np.ndarray:
+        buffer = self._buffers.get((index, shape))
+        if buffer is None or buffer.dtype != dtype:
+            buffer = np.empty(shape, dtype=dtype)
+            self._buffers[(index, shape)] = buffer
+        return buffer
+
+    def run(self, image: np.ndarray) -> np.ndarray:
+        for index, stage in enumerate(self.stages):
+            shape = stage.output_shape(image.shape)
+            out = None if shape is None else self._buffer(index, shape, image.dtype)
+            image = stage.apply(image, out)
+        return image
+
+    def clear(self) -> None:
+        self._buffers.clear()
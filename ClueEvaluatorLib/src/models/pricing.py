@@ -0,0 +1,389 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Optional
+
+import httpx
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+try:
+    from ClueEvaluatorLib.src.models.base import SQLITE_CHUNK_SIZE
+    from ClueEvaluatorLib.src.models.cache import LRUCache
+except:  # noqa: E722
+    from base import SQLITE_CHUNK_SIZE  # type: ignore[no-redef]
+    from cache import LRUCache  # type: ignore[no-redef]
+
+if TYPE_CHECKING:
+    from ClueEvaluatorLib.src.models.items import Item
+
+DEFAULT_PRICE_BASE_URL = "https://www.runescape.wiki/w/"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class PriceFetchError(Exception):
+    """Raised when a price could not be looked up, as opposed to an item without a price."""
+
+
+def parse_ge_price(content: str) -> Optional[int]:
+    _, found, tail = content.partition('id="GEPrice">')
+    if not found:
+        return None
+    try:
+        return int(tail.split("<", 1)[0].replace(",", "").strip())
+    except ValueError:
+        return None
+
+
+class PriceFetcher:
+    """Fetches Grand Exchange prices through one pooled async HTTP client.
+
+    Requests are bounded by ``concurrency``, every request is limited by
+    ``timeout`` and retried ``retries`` times with exponential backoff.
+    A missing page or a page without a price is reported as ``None``, a
+    lookup that keeps failing raises ``PriceFetchError``.
+    """
+
+    def __init__(
+        self,
+        base_url: str = DEFAULT_PRICE_BASE_URL,
+        concurrency: int = 8,
+        timeout: float = 10.0,
+        retries: int = 3,
+        backoff: float = 0.5,
+    ):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def __aenter__(self) -> PriceFetcher:
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
+
+    async def open(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.concurrency,
+                    max_keepalive_connections=self.concurrency,
+                ),
+                follow_redirects=True,
+            )
+        return self._client
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch_price(self, internal_name: str) -> Optional[int]:
+        client = await self.open()
+        async with self._semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await client.get(f"Exchange:{internal_name}")
+                    if response.is_success:
+                        return parse_ge_price(response.text)
+                    if response.status_code == 404:
+                        return None
+                    if response.status_code not in RETRY_STATUS_CODES:
+                        raise PriceFetchError(
+                            f"Price lookup for {internal_name} failed with status {response.status_code}"
+                        )
+                    print(f"Price lookup for {internal_name} failed with status {response.status_code}")
+                except httpx.TransportError as error:
+                    print(f"Price lookup for {internal_name} failed: {error!r}")
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * 2**attempt)
+        raise PriceFetchError(f"Giving up on price lookup for {internal_name}")
+
+    async def fetch_prices(self, internal_names: Iterable[str]) -> dict[str, Optional[int]]:
+        """Returns the looked up prices, names whose lookup failed are left out."""
+        names = list(dict.fromkeys(internal_names))
+        results = await asyncio.gather(
+            *[self.fetch_price(name) for name in names], return_exceptions=True
+        )
+        prices: dict[str, Optional[int]] = {}
+        for name, result in zip(names, results):
+            if isinstance(result, PriceFetchError):
+                print(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                prices[name] = result
+        return prices
+
+    async def update_item_prices(self, items: Iterable[Item], only_missing: bool = True) -> int:
+        targets = [item for item in items if item.price is None or not only_missing]
+        prices = await self.fetch_prices(str(item.internal_name) for item in targets)
+        updated = 0
+        for item in targets:
+            price = prices.get(str(item.internal_name))
+            if price is not None:
+                item.price = price
+                updated += 1
+        return updated
+
+
+class PriceCache:
+    """Remembers fetched prices in a ``pricecache`` table.
+
+    Lookups are served from an in-memory LRU tier backed by SQLite. Entries
+    older than ``ttl`` seconds are still returned, but queued for the
+    background refresher, so only prices never seen before wait on the network.
+    Items without a price (untradeable, unknown to the wiki) are remembered as
+    well and retried after ``negative_ttl`` seconds. A refresh whose lookup
+    fails keeps the stored price and is retried after ``retry_backoff``
+    seconds, doubling with every failure up to ``max_retry_backoff``.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        fetcher: PriceFetcher,
+        ttl: float = 6 * 3600,
+        negative_ttl: float = 3600,
+        hot_capacity: int = 4096,
+        refresh_interval: float = 60.0,
+        refresh_batch_size: int = 64,
+        retry_backoff: float = 60.0,
+        max_retry_backoff: float = 3600.0,
+        owns_engine: bool = False,
+    ):
+        self.engine = engine
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_interval = refresh_interval
+        self.refresh_batch_size = refresh_batch_size
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.owns_engine = owns_engine
+        self.hot: LRUCache[str, tuple[Optional[int], float]] = LRUCache(hot_capacity)
+        self._stale: set[str] = set()
+        # Names whose refresh failed: (earliest retry time, failures in a row).
+        self._retries: dict[str, tuple[float, int]] = {}
+        self._refresh_requested = asyncio.Event()
+        self._refresher: Optional[asyncio.Task[None]] = None
+        self._table_ready = False
+        self._listeners: list[Callable[[dict[str, int]], None]] = []
+
+    @classmethod
+    def open_file(cls, filepath: str, fetcher: PriceFetcher, **kwargs: Any) -> PriceCache:
+        """Returns a cache kept in its own SQLite file, closed together with the cache."""
+        engine = create_async_engine(f"sqlite+aiosqlite:///{filepath}")
+        return cls(engine=engine, fetcher=fetcher, owns_engine=True, **kwargs)
+
+    def add_listener(self, listener: Callable[[dict[str, int]], None]) -> None:
+        """Registers ``listener`` to receive every batch of newly stored prices."""
+        self._listeners.append(listener)
+
+    async def create_table(self) -> None:
+        if self._table_ready:
+            return
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text(
+                    "CREATE TABLE IF NOT EXISTS pricecache ("
+                    "internal_name VARCHAR PRIMARY KEY, "
+                    "price INTEGER, "
+                    "fetched_at FLOAT NOT NULL)"
+                ),
+            )
+            columns = await connection.execute(text("PRAGMA table_info(pricecache)"))
+            if any(column.name == "price" and column.notnull for column in columns):
+                # Tables created before negative entries were stored.
+                await connection.execute(text("ALTER TABLE pricecache RENAME TO pricecache_old"))
+                await connection.execute(
+                    text(
+                        "CREATE TABLE pricecache ("
+                        "internal_name VARCHAR PRIMARY KEY, "
+                        "price INTEGER, "
+                        "fetched_at FLOAT NOT NULL)"
+                    ),
+                )
+                await connection.execute(
+                    text("INSERT INTO pricecache SELECT * FROM pricecache_old"),
+                )
+                await connection.execute(text("DROP TABLE pricecache_old"))
+        self._table_ready = True
+
+    def _is_stale(self, price: Optional[int], fetched_at: float) -> bool:
+        ttl = self.ttl if price is not None else self.negative_ttl
+        return time.time() - fetched_at > ttl
+
+    async def _load(self, internal_names: list[str]) -> dict[str, tuple[Optional[int], float]]:
+        statement = text(
+            "SELECT internal_name, price, fetched_at FROM pricecache WHERE internal_name IN :names",
+        ).bindparams(bindparam("names", expanding=True))
+        loaded: dict[str, tuple[Optional[int], float]] = {}
+        async with self.engine.connect() as connection:
+            for start in range(0, len(internal_names), SQLITE_CHUNK_SIZE):
+                chunk = internal_names[start : start + SQLITE_CHUNK_SIZE]
+                for name, price, fetched_at in await connection.execute(statement, {"names": chunk}):
+                    loaded[name] = (price, fetched_at)
+                    self.hot.put(name, (price, fetched_at))
+        return loaded
+
+    async def store(self, prices: dict[str, Optional[int]]) -> None:
+        if not prices:
+            return
+        now = time.time()
+        await self.create_table()
+        async with self.engine.begin() as connection:
+            await connection.execute(
+                text(
+                    "INSERT INTO pricecache (internal_name, price, fetched_at) "
+                    "VALUES (:internal_name, :price, :fetched_at) "
+                    "ON CONFLICT(internal_name) DO UPDATE SET "
+                    "price = excluded.price, fetched_at = excluded.fetched_at"
+                ),
+                [
+                    {"internal_name": name, "price": price, "fetched_at": now}
+                    for name, price in prices.items()
+                ],
+            )
+        for name, price in prices.items():
+            self.hot.put(name, (price, now))
+            self._stale.discard(name)
+            self._retries.pop(name, None)
+        stored = {name: price for name, price in prices.items() if price is not None}
+        if stored:
+            for listener in self._listeners:
+                listener(stored)
+
+    def request_refresh(self, internal_name: str) -> None:
+        if internal_name in self._retries:
+            return
+        self._stale.add(internal_name)
+        if len(self._stale) >= self.refresh_batch_size:
+            self._refresh_requested.set()
+
+    async def get_prices(
+        self, internal_names: Iterable[str], fetch_missing: bool = True
+    ) -> dict[str, Optional[int]]:
+        await self.create_table()
+        names = list(dict.fromkeys(internal_names))
+        entries: dict[str, tuple[Optional[int], float]] = {}
+        cold: list[str] = []
+        for name in names:
+            entry = self.hot.get(name)
+            if entry is None:
+                cold.append(name)
+            else:
+                entries[name] = entry
+        if cold:
+            entries.update(await self._load(cold))
+
+        for name, (price, fetched_at) in entries.items():
+            if self._is_stale(price, fetched_at):
+                self.request_refresh(name)
+
+        prices: dict[str, Optional[int]] = {name: entry[0] for name, entry in entries.items()}
+        missing = [name for name in names if name not in entries]
+        if missing and fetch_missing:
+            fetched = await self.fetcher.fetch_prices(missing)
+            await self.store(fetched)
+            prices.update(fetched)
+        return prices
+
+    async def get_price(self, internal_name: str, fetch_missing: bool = True) -> Optional[int]:
+        return (await self.get_prices([internal_name], fetch_missing=fetch_missing)).get(internal_name)
+
+    async def update_item_prices(self, items: Iterable[Item]) -> int:
+        targets = [item for item in items if item.price is None]
+        prices = await self.get_prices(str(item.internal_name) for item in targets)
+        updated = 0
+        for item in targets:
+            price = prices.get(str(item.internal_name))
+            if price is not None:
+                item.price = price
+                updated += 1
+        return updated
+
+    def _defer(self, internal_name: str, now: float) -> None:
+        failures = self._retries.get(internal_name, (0.0, 0))[1] + 1
+        delay = min(self.retry_backoff * 2 ** (failures - 1), self.max_retry_backoff)
+        self._retries[internal_name] = (now + delay, failures)
+
+    async def _expired_names(self) -> list[str]:
+        async with self.engine.connect() as connection:
+            result = await connection.execute(
+                text(
+                    "SELECT internal_name FROM pricecache "
+                    "WHERE fetched_at < CASE WHEN price IS NULL THEN :negative_cutoff ELSE :cutoff END "
+                    "LIMIT :limit"
+                ),
+                {
+                    "cutoff": time.time() - self.ttl,
+                    "negative_cutoff": time.time() - self.negative_ttl,
+                    "limit": self.refresh_batch_size + len(self._retries),
+                },
+            )
+            names = [name for name in result.scalars() if name not in self._retries]
+            return names[: self.refresh_batch_size]
+
+    async def refresh_stale(self) -> int:
+        """Refetches one batch of stale prices, returns how many were stored."""
+        now = time.time()
+        self._stale.update(name for name, (retry_at, _) in self._retries.items() if retry_at <= now)
+        if not self._stale:
+            self._stale.update(await self._expired_names())
+        batch = [self._stale.pop() for _ in range(min(len(self._stale), self.refresh_batch_size))]
+        if not batch:
+            return 0
+        try:
+            prices = await self.fetcher.fetch_prices(batch)
+        except Exception:
+            self._stale.update(batch)
+            raise
+        await self.store(prices)
+        failed = [name for name in batch if name not in prices]
+        for name in failed:
+            self._defer(name, now)
+        if failed:
+            print(f"Keeping {len(failed)} stale prices after failed lookups")
+        return len(prices)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._refresh_requested.wait(), timeout=self.refresh_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._refresh_requested.clear()
+            try:
+                refreshed = await self.refresh_stale()
+                if refreshed:
+                    print(f"Refreshed {refreshed} stale prices")
+            except Exception as error:
+                print(f"Refreshing stale prices failed: {error!r}")
+
+    async def start(self) -> None:
+        await self.create_table()
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresher is not None:
+            self._refresher.cancel()
+            try:
+                await self._refresher
+            except asyncio.CancelledError:
+                pass
+            self._refresher = None
+
+    async def close(self) -> None:
+        await self.stop()
+        if self.owns_engine:
+            await self.engine.dispose()
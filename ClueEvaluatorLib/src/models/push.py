@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+try:
+    from ClueEvaluatorLib.src.models.statistics import WealthEvaluator
+except:  # noqa: E722
+    from statistics import WealthEvaluator  # type: ignore[no-redef,attr-defined]
+
+
+class EvaluatorUpdates:
+    """Pushes wealth evaluator snapshots to subscribers whenever it changes.
+
+    Change notifications arriving within ``debounce`` seconds are coalesced
+    into one snapshot, but a steady stream of changes is still published at
+    least every ``max_delay`` seconds. While subscribers are connected, a
+    snapshot is also taken every ``max_delay`` seconds without any change, so
+    time dependent rates keep moving between caskets. Unchanged snapshots are
+    not sent. Each subscriber holds only the latest snapshot, so slow clients
+    skip intermediate states instead of queueing them.
+    """
+
+    def __init__(self, evaluator: WealthEvaluator, debounce: float = 0.25, max_delay: float = 1.0):
+        self.evaluator = evaluator
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.latest: Optional[dict[str, Any]] = None
+        self._subscribers: set[asyncio.Queue[Optional[dict[str, Any]]]] = set()
+        self._changed = asyncio.Event()
+        self._publisher: Optional[asyncio.Task[None]] = None
+
+    def notify(self) -> None:
+        self._changed.set()
+
+    async def _wait_quiet(self) -> None:
+        deadline = time.monotonic() + self.max_delay
+        while True:
+            self._changed.clear()
+            timeout = min(self.debounce, deadline - time.monotonic())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return
+
+    async def publish(self) -> bool:
+        snapshot = await self.evaluator.get_info()
+        if snapshot == self.latest:
+            return False
+        self.latest = snapshot
+        for queue in self._subscribers:
+            self._offer(queue, snapshot)
+        return True
+
+    @staticmethod
+    def _offer(
+        queue: asyncio.Queue[Optional[dict[str, Any]]], snapshot: Optional[dict[str, Any]]
+    ) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(snapshot)
+
+    async def _wait_change(self) -> None:
+        if not self._subscribers:
+            await self._changed.wait()
+            await self._wait_quiet()
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=self.max_delay)
+        except asyncio.TimeoutError:
+            return
+        await self._wait_quiet()
+
+    async def _publish_loop(self) -> None:
+        while True:
+            await self._wait_change()
+            try:
+                await self.publish()
+            except Exception as error:
+                print(f"Publishing wealth evaluator update failed: {error!r}")
+
+    async def start(self) -> None:
+        self.evaluator.add_listener(self.notify)
+        if self._publisher is None or self._publisher.done():
+            self._publisher = asyncio.create_task(self._publish_loop())
+
+    async def stop(self) -> None:
+        self.evaluator.remove_listener(self.notify)
+        if self._publisher is not None:
+            self._publisher.cancel()
+            try:
+                await self._publisher
+            except asyncio.CancelledError:
+                pass
+            self._publisher = None
+        for queue in self._subscribers:
+            self._offer(queue, None)
+        self._subscribers.clear()
+
+    @asynccontextmanager
+    async def subscribe(self) -> AsyncIterator[asyncio.Queue[Optional[dict[str, Any]]]]:
+        """Yields a queue receiving the current snapshot followed by every published change.
+
+        ``None`` is queued once the updates are stopped.
+        """
+        queue: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue(maxsize=1)
+        if self.latest is None:
+            self.latest = await self.evaluator.get_info()
+        queue.put_nowait(self.latest)
+        self._subscribers.add(queue)
+        # Wakes the publisher, which only ticks while someone is subscribed.
+        self.notify()
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
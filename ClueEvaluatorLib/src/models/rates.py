@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import time
+from typing import Callable, Optional
+
+from pydantic import BaseModel
+
+DEFAULT_WINDOWS = {"10m": 600.0, "1h": 3600.0}
+
+
+class WindowRates(BaseModel):  # type: ignore
+    window: str
+    caskets: int
+    value: int
+    uniques: int
+    broadcasts: int
+    gp_per_hour: int
+    caskets_per_hour: float
+    uniques_per_hour: float
+    unique_rate: float
+    broadcast_rate: float
+    complete: bool
+
+
+class RollingWindow:
+    """Running sums over the events of the last ``duration`` seconds.
+
+    ``tail`` is the sequence number of the oldest event still counted.
+    A ``duration`` of ``None`` keeps every event of the session.
+    """
+
+    def __init__(self, name: str, duration: Optional[float]):
+        self.name = name
+        self.duration = duration
+        self.reset()
+
+    def reset(self) -> None:
+        self.tail = 0
+        self.caskets = 0
+        self.value = 0
+        self.uniques = 0
+        self.broadcasts = 0
+        self.incomplete_until = float("-inf")
+
+    def add(self, value: int, is_unique: bool, is_broadcast: bool, sign: int = 1) -> None:
+        self.caskets += sign
+        self.value += sign * value
+        self.uniques += sign * is_unique
+        self.broadcasts += sign * is_broadcast
+
+    def rates(self, now: float, started: float) -> WindowRates:
+        elapsed = now - started if self.duration is None else min(self.duration, now - started)
+        per_hour = 3600 / elapsed if elapsed > 0 else 0.0
+        return WindowRates(
+            window=self.name,
+            caskets=self.caskets,
+            value=self.value,
+            uniques=self.uniques,
+            broadcasts=self.broadcasts,
+            gp_per_hour=int(self.value * per_hour),
+            caskets_per_hour=round(self.caskets * per_hour, 2),
+            uniques_per_hour=round(self.uniques * per_hour, 2),
+            unique_rate=self.uniques / self.caskets if self.caskets else 0.0,
+            broadcast_rate=self.broadcasts / self.caskets if self.caskets else 0.0,
+            complete=now >= self.incomplete_until,
+        )
+
+
+class RateTracker:
+    """Casket events in a fixed-size ring buffer with rolling window aggregates.
+
+    Every window keeps running sums and drops events once they are older than
+    its duration, so recording and reading rates are amortized O(1). If the
+    buffer overwrites an event a window still covers, that window is reported
+    as incomplete until the event would have expired anyway.
+    """
+
+    def __init__(
+        self,
+        windows: Optional[dict[str, float]] = None,
+        capacity: int = 4096,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if capacity <= 0:
+            raise ValueError("Required arg 'capacity' must be positive.")
+        self.capacity = capacity
+        self.clock = clock
+        self.windows = [
+            RollingWindow(name, duration) for name, duration in (windows or DEFAULT_WINDOWS).items()
+        ]
+        self.session = RollingWindow("session", None)
+        self._times = [0.0] * capacity
+        self._values = [0] * capacity
+        self._uniques = [False] * capacity
+        self._broadcasts = [False] * capacity
+        self.reset()
+
+    def reset(self) -> None:
+        self.head = 0
+        self.started = self.clock()
+        self.session.reset()
+        for window in self.windows:
+            window.reset()
+
+    def _evict(self, window: RollingWindow) -> None:
+        slot = window.tail % self.capacity
+        window.add(self._values[slot], self._uniques[slot], self._broadcasts[slot], sign=-1)
+        window.tail += 1
+
+    def _expire(self, now: float) -> None:
+        for window in self.windows:
+            cutoff = now - float(window.duration or 0)
+            while window.tail < self.head and self._times[window.tail % self.capacity] <= cutoff:
+                self._evict(window)
+
+    def record(
+        self, value: int, is_unique: bool, is_broadcast: bool, timestamp: Optional[float] = None
+    ) -> None:
+        now = self.clock() if timestamp is None else timestamp
+        self._expire(now)
+        if self.head >= self.capacity:
+            overwritten = self.head - self.capacity
+            for window in self.windows:
+                if window.tail <= overwritten:
+                    window.incomplete_until = self._times[overwritten % self.capacity] + float(
+                        window.duration or 0
+                    )
+                    self._evict(window)
+
+        slot = self.head % self.capacity
+        self._times[slot] = now
+        self._values[slot] = value
+        self._uniques[slot] = is_unique
+        self._broadcasts[slot] = is_broadcast
+        self.head += 1
+        self.session.add(value, is_unique, is_broadcast)
+        for window in self.windows:
+            window.add(value, is_unique, is_broadcast)
+
+    def rates(self, now: Optional[float] = None) -> list[WindowRates]:
+        now = self.clock() if now is None else now
+        self._expire(now)
+        return [window.rates(now, self.started) for window in (*self.windows, self.session)]
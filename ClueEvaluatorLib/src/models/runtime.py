@@ -1,13 +1,37 @@
 from __future__ import annotations
 
-from typing import Optional
+from typing import AsyncIterator, Optional
 
 from ClueEvaluatorLib.src.models.base import DBBaseModel
+from ClueEvaluatorLib.src.models.cache import ResponseCache
+from ClueEvaluatorLib.src.models.catalog import CatalogIndex
 from ClueEvaluatorLib.src.models.dbhandler import DataBaseHandler
-from ClueEvaluatorLib.src.models.items import Item
-from ClueEvaluatorLib.src.models.util import FileReader
+from ClueEvaluatorLib.src.models.expected_value import CasketExpectation, ExpectedValueEngine
+from ClueEvaluatorLib.src.models.items import (
+    CatalogRow,
+    DropSources,
+    Item,
+    ItemDropSource,
+    ItemModifiers,
+    ItemQuantity,
+)
+from ClueEvaluatorLib.src.models.matching import ItemMatcher, ResolvedItem
+from ClueEvaluatorLib.src.models.persistence import StatisticsWriter
+from ClueEvaluatorLib.src.models.pricing import PriceCache, PriceFetcher
+from ClueEvaluatorLib.src.models.sessions import PlayerSession, SessionRegistry
+from ClueEvaluatorLib.src.models.simulation import MonteCarloSimulator, SimulationReport
+from ClueEvaluatorLib.src.models.snapshot import CatalogSnapshot
+from ClueEvaluatorLib.src.models.util import CatalogSyncResult, FileReader
 
-from ClueEvaluatorLib.src.models.statistics import InitParams, Statistics, WealthEvaluator  # isort: skip
+from ClueEvaluatorLib.src.models.statistics import (  # isort: skip
+    CasketResult,
+    CasketReward,
+    InitParams,
+    Statistics,
+)
+
+CATALOG_RESPONSES = "catalog"
+STATISTICS_RESPONSES = "statistics"
 
 
 class Runtime:
@@ -17,52 +41,240 @@ class Runtime:
         db_filepath: str,
         db_object_types: list[type[DBBaseModel]],
         db_echo: bool = True,
+        price_fetcher: Optional[PriceFetcher] = None,
+        price_ttl: float = 6 * 3600,
+        snapshot_filepath: Optional[str] = None,
+        price_cache_filepath: Optional[str] = None,
     ):
         self.reader: FileReader = FileReader(datafile=csv_filepath)
+        self.snapshot: Optional[CatalogSnapshot] = (
+            CatalogSnapshot(snapshot_filepath) if snapshot_filepath else None
+        )
         self.dbhandler: DataBaseHandler = DataBaseHandler(
             dbfile=db_filepath,
             echo=db_echo,
             db_object_types=db_object_types,
         )
-        self.evaluator: WealthEvaluator
+        self.price_fetcher: PriceFetcher = price_fetcher or PriceFetcher()
+        # A separate file keeps the fetched prices when the database is rebuilt.
+        self.price_cache: PriceCache = (
+            PriceCache.open_file(price_cache_filepath, fetcher=self.price_fetcher, ttl=price_ttl)
+            if price_cache_filepath
+            else PriceCache(engine=self.dbhandler.engine, fetcher=self.price_fetcher, ttl=price_ttl)
+        )
+        self.catalog: CatalogIndex = CatalogIndex(())
+        self.matcher: ItemMatcher = ItemMatcher(self.catalog)
+        self.expected_values: ExpectedValueEngine = ExpectedValueEngine(())
+        self.price_cache.add_listener(self._apply_prices)
+        self.simulator: MonteCarloSimulator = MonteCarloSimulator()
+        self.stats_writer: StatisticsWriter = StatisticsWriter(self.dbhandler)
+        self.sessions: SessionRegistry = SessionRegistry(self.dbhandler, self.stats_writer)
+        self.responses: ResponseCache = ResponseCache()
+
+    async def start(self) -> None:
+        await self.price_cache.start()
+        await self.stats_writer.start()
+        await self.sessions.start()
+
+    async def close(self) -> None:
+        await self.sessions.close()
+        await self.stats_writer.stop()
+        await self.price_cache.close()
+        await self.price_fetcher.close()
+        await self.dbhandler.close()
+        self.simulator.close()
+
+    async def update_prices(self, items: Optional[list[Item]] = None) -> None:
+        updated = await self.price_cache.update_item_prices(
+            self.reader.items if items is None else items
+        )
+        print(f"Updated prices of {updated} items")
+
+    async def load_data(self) -> None:
+        """Fills the reader from the catalog snapshot, the CSV is only parsed if it changed."""
+        if self.snapshot is None:
+            await self.reader._get_data()
+        else:
+            await self.snapshot.load(self.reader)
+
+    async def build_catalog(self) -> None:
+        if not self.reader.items and self.snapshot is not None:
+            self.snapshot.restore(self.reader)
+        items = self.reader.items or await self.dbhandler.get_all_items()
+        await self.update_prices(items)
+        self.catalog = CatalogIndex(items)
+        self.matcher = ItemMatcher(self.catalog)
+        self.expected_values = ExpectedValueEngine(self.catalog.items)
+        self.responses.invalidate(CATALOG_RESPONSES)
+        print(f"Indexed {len(self.catalog)} catalog items")
+
+    def _apply_prices(self, prices: dict[str, int]) -> None:
+        changed = []
+        for internal_name, price in prices.items():
+            item = self.catalog.get_by_internal_name(internal_name)
+            if item is not None and item.price != price:
+                item.price = price
+                changed.append(item)
+        if changed:
+            self.expected_values.update_prices(changed)
+            self.responses.invalidate(CATALOG_RESPONSES)
+
+    async def get_expected_values(self, tier: Optional[str] = None) -> list[CasketExpectation]:
+        return self.expected_values.expectations(tier)
+
+    def simulate(
+        self, tier: str, caskets: int, seed: Optional[int] = None, player_name: Optional[str] = None
+    ) -> AsyncIterator[SimulationReport]:
+        """Returns the stream of reports, raises ``KeyError`` right away for an unknown tier or player."""
+        session = self.sessions.get(player_name) if player_name else None
+        if player_name and session is None:
+            raise KeyError(player_name)
+        stats = session.stats if session else None
+        return self.simulator.run(self.catalog.items, tier, caskets, seed=seed, stats=stats)
+
+    async def get_item_price(self, item: Item) -> Optional[int]:
+        if item.price is not None:
+            return item.price
+        return await self.price_cache.get_price(str(item.internal_name))
+
+    async def build_database(self, batch_size: Optional[int] = None) -> None:
+        async with self.dbhandler.bulk_load() as connection:
+            for object_type, instances, check_existence in (
+                (DropSources, self.reader.dropsources, True),
+                (ItemQuantity, self.reader.quantities, True),
+                (ItemModifiers, self.reader.modifiers, False),
+                (Item, self.reader.items, True),
+                (
+                    ItemDropSource,
+                    [relation for item in self.reader.items for relation in item.db_relations()],
+                    True,
+                ),
+                (CatalogRow, self.reader.catalog_rows(), True),
+            ):
+                inserted = await self.dbhandler.bulk_add_db_items(
+                    connection,
+                    object_type,
+                    instances,
+                    check_existence=check_existence,
+                    batch_size=batch_size,
+                )
+                print(f"Created {inserted} rows for {object_type.__name__}")
+
+    async def sync_catalog(self) -> CatalogSyncResult:
+        """Applies CSV edits to the database and catalog, parsing only rows whose fingerprint changed."""
+        stored = await self.dbhandler.get_catalog_fingerprints()
+        reader = FileReader(datafile=self.reader.datafile)
+        rows = reader.read_fingerprints()
+        changed = [row for name, (fingerprint, row) in rows.items() if stored.get(name) != fingerprint]
+        removed = [name for name in stored if name not in rows]
+        result = CatalogSyncResult(
+            added=sum(1 for row in changed if row["display_name"] not in stored),
+            updated=sum(1 for row in changed if row["display_name"] in stored),
+            removed=len(removed),
+            unchanged=len(rows) - len(changed),
+        )
+        if not changed and not removed:
+            return result
 
-    async def build_database(self) -> None:
-        print("Creating Dropsources:\n")
-        for source in self.reader.dropsources:
-            print(f"\t{source}")
-            await self.dbhandler.add_db_item(source, instant_commit=True)
+        await reader.parse_rows(changed)
+        await self.dbhandler.sync_catalog(
+            lookups=(
+                (DropSources, reader.dropsources),
+                (ItemQuantity, reader.quantities),
+                (ItemModifiers, reader.modifiers),
+            ),
+            items=reader.items,
+            catalog_rows=reader.catalog_rows(),
+            removed=removed,
+        )
+        print(f"Synced catalog: {result}")
 
-        print("\nCreating Quantities:\n")
-        for quantitiy in self.reader.quantities:
-            print(f"\t{quantitiy}")
-            await self.dbhandler.add_db_item(quantitiy, instant_commit=True)
+        await self.update_prices(reader.items)
+        self.reader = FileReader(datafile=self.reader.datafile)
+        self._apply_catalog_changes(reader.items, removed)
+        self.responses.invalidate(CATALOG_RESPONSES)
+        return result
 
-        print("\nCreating Modifiers:\n")
-        for modifier in self.reader.modifiers:
-            print(f"\t{modifier}")
-            await self.dbhandler.add_db_item(modifier, check_existence=False, instant_commit=True)
+    def _apply_catalog_changes(self, changed: list[Item], removed: list[str]) -> None:
+        # Price edits keep the catalog's item objects, any other edit rebuilds the indexes.
+        found = [self.catalog.get_by_display_name(item.display_name) for item in changed]
+        current = [old for old in found if old is not None]
+        if (
+            not removed
+            and len(current) == len(changed)
+            and all(
+                old.model_dump(exclude={"price"}) == item.model_dump(exclude={"price"})
+                for old, item in zip(current, changed)
+            )
+        ):
+            for old, item in zip(current, changed):
+                old.price = item.price
+            self.expected_values.update_prices(current)
+            return
 
-        print("\nCreating Items:\n")
-        for item in self.reader.items:
-            print(f"\t{item}")
-            await self.dbhandler.add_db_item(item, instant_commit=True)
+        items = {item.display_name: item for item in self.catalog.items}
+        for name in removed:
+            items.pop(name, None)
+        items.update((item.display_name, item) for item in changed)
+        self.catalog = CatalogIndex(items.values())
+        self.matcher = ItemMatcher(self.catalog)
+        self.expected_values = ExpectedValueEngine(self.catalog.items)
 
     async def add_player(self, params: InitParams, stats: Statistics) -> None:
-        await self.dbhandler.add_db_item(params, instant_commit=True)
-        await self.dbhandler.add_db_item(stats, instant_commit=True)
+        async with self.dbhandler.session_factory() as session:
+            await self.dbhandler.add_db_item(params, instant_commit=False, session=session)
+            await self.dbhandler.add_db_item(stats, instant_commit=False, session=session)
+            await session.commit()
 
     async def get_items(self) -> list[Item]:
-        return self.reader.items
+        return list(self.catalog.items)
 
     async def get_item(self, item_name: str) -> Optional[Item]:
-        return await self.dbhandler.get_item(item_name)
+        return self.catalog.get(item_name)
+
+    async def search_items(self, prefix: str, limit: int = 10) -> list[Item]:
+        return self.catalog.search_prefix(prefix, limit=limit)
+
+    async def resolve_items(self, text: str, min_confidence: float = 0.5) -> list[ResolvedItem]:
+        return self.matcher.resolve(text, min_confidence=min_confidence)
 
     async def get_player_stats(self, player_name: str) -> Optional[Statistics]:
+        session = self.sessions.get(player_name)
+        if session is not None:
+            return session.stats
         return await self.dbhandler.get_player_stats(player_name)
 
-    async def init_evaluator(self, stats: Optional[Statistics]) -> None:
-        if not stats:
-            raise ValueError("Required arg 'stats' is None.")
-        self.evaluator = WealthEvaluator(
-            stats=stats,
-        )
+    async def open_session(self, settings: InitParams) -> PlayerSession:
+        session = await self.sessions.open(settings)
+        self.responses.invalidate(STATISTICS_RESPONSES, session.player_name)
+        return session
+
+    def get_session(self, player_name: str) -> Optional[PlayerSession]:
+        return self.sessions.get(player_name)
+
+    def evaluate_reward(self, reward: CasketReward) -> CasketResult:
+        value, is_unique, is_broadcast = 0, False, False
+        for reward_item in reward.items:
+            item = self.catalog.get(reward_item.item_name)
+            if item is None:
+                raise KeyError(reward_item.item_name)
+            value += (item.price or 0) * reward_item.quantity
+            is_unique = is_unique or item.is_unique
+            is_broadcast = is_broadcast or item.is_broadcast
+        return CasketResult(value=value, is_unique=is_unique, is_broadcast=is_broadcast)
+
+    async def record_rewards(
+        self, session: PlayerSession, rewards: list[CasketReward]
+    ) -> list[CasketResult]:
+        """Adds opened caskets to the player's evaluator and queues their statistics for writing.
+
+        All rewards are evaluated before any is recorded, so an unknown item
+        rejects the whole batch.
+        """
+        results = [self.evaluate_reward(reward) for reward in rewards]
+        for result in results:
+            await session.evaluator.add_casket(result)
+            self.stats_writer.mark_dirty(session.stats)
+        if results:
+            self.responses.invalidate(STATISTICS_RESPONSES, session.player_name)
+        return results
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+try:
+    from ClueEvaluatorLib.src.models.dbhandler import DataBaseHandler
+    from ClueEvaluatorLib.src.models.persistence import StatisticsWriter
+    from ClueEvaluatorLib.src.models.push import EvaluatorUpdates
+    from ClueEvaluatorLib.src.models.statistics import InitParams, Statistics, WealthEvaluator
+except:  # noqa: E722
+    from statistics import InitParams, Statistics, WealthEvaluator  # type: ignore[no-redef,attr-defined]
+
+    from dbhandler import DataBaseHandler  # type: ignore[no-redef]
+    from persistence import StatisticsWriter  # type: ignore[no-redef]
+    from push import EvaluatorUpdates  # type: ignore[no-redef]
+
+
+class PlayerSession:
+    """Settings, evaluator and update channel of one active player."""
+
+    def __init__(self, settings: InitParams, evaluator: WealthEvaluator, updates: EvaluatorUpdates):
+        self.settings = settings
+        self.evaluator = evaluator
+        self.updates = updates
+        self.last_used = 0.0
+
+    @property
+    def player_name(self) -> str:
+        return self.settings.player_name
+
+    @property
+    def stats(self) -> Statistics:
+        return self.evaluator.stats
+
+
+class SessionRegistry:
+    """Active player sessions sharing one catalog and database engine.
+
+    Sessions are kept in least recently used order. Opening a session beyond
+    ``capacity`` evicts the least recently used one, and sessions idle for
+    longer than ``idle_timeout`` seconds are evicted in the background.
+    Sessions with update subscribers are never evicted. Evicted sessions
+    write their statistics before they are dropped.
+    """
+
+    def __init__(
+        self,
+        dbhandler: DataBaseHandler,
+        stats_writer: StatisticsWriter,
+        capacity: int = 16,
+        idle_timeout: float = 1800.0,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if capacity <= 0:
+            raise ValueError("Required arg 'capacity' must be positive.")
+        self.dbhandler = dbhandler
+        self.stats_writer = stats_writer
+        self.capacity = capacity
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.clock = clock
+        self._sessions: OrderedDict[str, PlayerSession] = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._sweeper: Optional[asyncio.Task[None]] = None
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, player_name: str) -> bool:
+        return player_name in self._sessions
+
+    def get(self, player_name: str) -> Optional[PlayerSession]:
+        session = self._sessions.get(player_name)
+        if session is not None:
+            session.last_used = self.clock()
+            self._sessions.move_to_end(player_name)
+        return session
+
+    def active(self) -> list[PlayerSession]:
+        """Open sessions, least recently used first."""
+        return list(self._sessions.values())
+
+    def latest(self) -> Optional[PlayerSession]:
+        return self._sessions[next(reversed(self._sessions))] if self._sessions else None
+
+    async def _load_stats(self, settings: InitParams) -> Statistics:
+        stats = await self.dbhandler.get_player_stats(settings.player_name)
+        if stats is None:
+            stats = Statistics(
+                player_name=settings.player_name, openend_caskets=0, uniques=0, broadcasts=0
+            )
+            async with self.dbhandler.session_factory() as session:
+                await self.dbhandler.add_db_item(settings, instant_commit=False, session=session)
+                await self.dbhandler.add_db_item(stats, instant_commit=False, session=session)
+                await session.commit()
+        return stats
+
+    async def open(self, settings: InitParams) -> PlayerSession:
+        """Returns the session of ``settings.player_name``, loading it from the database if needed."""
+        async with self._lock:
+            session = self.get(settings.player_name)
+            if session is not None:
+                session.settings = settings
+                return session
+
+            evaluator = WealthEvaluator(stats=await self._load_stats(settings))
+            session = PlayerSession(settings, evaluator, EvaluatorUpdates(evaluator))
+            await session.updates.start()
+            session.last_used = self.clock()
+            self._sessions[settings.player_name] = session
+            while len(self._sessions) > self.capacity:
+                evictable = next(
+                    (
+                        name
+                        for name, open_session in self._sessions.items()
+                        if self._evictable(open_session)
+                    ),
+                    None,
+                )
+                if evictable is None:
+                    break
+                await self._evict(evictable)
+            return session
+
+    @staticmethod
+    def _evictable(session: PlayerSession) -> bool:
+        return session.updates.subscriber_count == 0
+
+    async def _evict(self, player_name: str) -> None:
+        session = self._sessions.pop(player_name)
+        await session.updates.stop()
+        await self.dbhandler.save_player_stats([session.stats])
+        print(f"Closed session of {player_name}")
+
+    async def evict_idle(self) -> int:
+        async with self._lock:
+            cutoff = self.clock() - self.idle_timeout
+            idle = [
+                name
+                for name, session in self._sessions.items()
+                if session.last_used <= cutoff and self._evictable(session)
+            ]
+            for player_name in idle:
+                await self._evict(player_name)
+            return len(idle)
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.evict_idle()
+            except Exception as error:
+                print(f"Evicting idle sessions failed: {error!r}")
+
+    async def start(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+        async with self._lock:
+            for player_name in list(self._sessions):
+                await self._evict(player_name)
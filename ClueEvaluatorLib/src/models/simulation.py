@@ -0,0 +1,385 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import AsyncIterator, Iterable, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+try:
+    from ClueEvaluatorLib.src.models.items import Item
+    from ClueEvaluatorLib.src.models.statistics import Statistics
+except:  # noqa: E722
+    from statistics import Statistics  # type: ignore[no-redef,attr-defined]
+
+    from items import Item  # type: ignore[no-redef]
+
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+SKETCH_POINTS = np.linspace(0, 1, 201)
+
+
+class SimulationTable:
+    """Drop entries of one casket tier as flat arrays, cheap to send to worker processes."""
+
+    def __init__(self, tier: str, items: Iterable[Item]):
+        rates, minimum, maximum, prices, unique, broadcast = [], [], [], [], [], []
+        for item in items:
+            for source in item.dropsources:
+                if source.name != tier or not source.decimal_rate:
+                    continue
+                rates.append(min(float(source.decimal_rate), 1.0))
+                minimum.append(item.itemquantity.minquantity)
+                maximum.append(item.itemquantity.maxquantity)
+                prices.append(item.price or 0)
+                unique.append(item.is_unique)
+                broadcast.append(item.is_broadcast)
+        self.tier = tier
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self.minimum = np.asarray(minimum, dtype=np.int64)
+        self.maximum = np.asarray(maximum, dtype=np.int64)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self.unique = np.asarray(unique, dtype=bool)
+        self.broadcast = np.asarray(broadcast, dtype=bool)
+
+    def __len__(self) -> int:
+        return len(self.rates)
+
+
+class BatchSummary:
+    """Mergeable aggregates of one simulated batch."""
+
+    def __init__(
+        self,
+        caskets: int,
+        value_sum: float,
+        value_squares: float,
+        uniques: int,
+        broadcasts: int,
+        value_sketch: np.ndarray,
+        gap_count: int,
+        gap_sketch: np.ndarray,
+        first_gap: Optional[int],
+        open_gap: int,
+        blocks: int,
+        unique_blocks_below: float,
+        broadcast_blocks_below: float,
+    ):
+        self.caskets = caskets
+        self.value_sum = value_sum
+        self.value_squares = value_squares
+        self.uniques = uniques
+        self.broadcasts = broadcasts
+        self.value_sketch = value_sketch
+        self.gap_count = gap_count
+        self.gap_sketch = gap_sketch
+        self.first_gap = first_gap
+        self.open_gap = open_gap
+        self.blocks = blocks
+        self.unique_blocks_below = unique_blocks_below
+        self.broadcast_blocks_below = broadcast_blocks_below
+
+
+def drop_positions(
+    rng: np.random.Generator, rates: np.ndarray, caskets: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Entries and caskets of all drops for independent per-casket drop chances.
+
+    Instead of one random number per entry and casket, the distances between
+    consecutive drops of an entry are drawn from a geometric distribution, so
+    the work is proportional to the number of drops.
+    """
+    pending = np.flatnonzero(rates > 0)
+    base = np.zeros(len(pending), dtype=np.int64)
+    found_entries, found_positions = [], []
+    while len(pending):
+        pending_rates = rates[pending]
+        expected = pending_rates * (caskets - base)
+        sizes = np.ceil(expected + 6 * np.sqrt(expected) + 8).astype(np.int64)
+        ends = np.cumsum(sizes)
+        positions = np.cumsum(rng.geometric(np.repeat(pending_rates, sizes)))
+        segment_start = np.concatenate(([0], positions[ends[:-1] - 1]))
+        positions += np.repeat(base - segment_start, sizes) - 1
+        last = positions[ends - 1]
+        keep = positions < caskets
+        found_entries.append(np.repeat(pending, sizes)[keep])
+        found_positions.append(positions[keep])
+        uncovered = last < caskets - 1
+        pending, base = pending[uncovered], last[uncovered] + 1
+    if not found_entries:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(found_entries), np.concatenate(found_positions)
+
+
+def _blocks_below(counts: np.ndarray, block_size: int, observed: int) -> tuple[int, float]:
+    blocks = len(counts) // block_size
+    if not blocks:
+        return 0, 0.0
+    totals = counts[: blocks * block_size].reshape(blocks, block_size).sum(axis=1)
+    return blocks, float((totals < observed).sum() + 0.5 * (totals == observed).sum())
+
+
+def simulate_batch(
+    table: SimulationTable,
+    seed: np.random.SeedSequence,
+    caskets: int,
+    player: Optional[tuple[int, int, int]] = None,
+) -> BatchSummary:
+    """Simulates ``caskets`` openings; ``player`` is (caskets, uniques, broadcasts) to compare against."""
+    rng = np.random.default_rng(seed)
+    entries, positions = drop_positions(rng, table.rates, caskets)
+    quantities = rng.integers(table.minimum[entries], table.maximum[entries] + 1)
+    values = np.bincount(positions, weights=table.prices[entries] * quantities, minlength=caskets)
+    unique = np.bincount(positions[table.unique[entries]], minlength=caskets) > 0
+    broadcast = np.bincount(positions[table.broadcast[entries]], minlength=caskets) > 0
+
+    # Only gaps between two uniques of the batch are complete. The caskets up
+    # to the first and after the last unique continue gaps of the neighbouring
+    # batches and are joined in batch order by ``SimulationRun``.
+    unique_positions = np.flatnonzero(unique)
+    gaps = np.diff(unique_positions)
+    first_gap = int(unique_positions[0]) + 1 if len(unique_positions) else None
+    open_gap = caskets - 1 - int(unique_positions[-1]) if len(unique_positions) else caskets
+
+    blocks, unique_below, broadcast_below = 0, 0.0, 0.0
+    if player is not None and player[0] > 0:
+        blocks, unique_below = _blocks_below(unique.astype(np.int64), player[0], player[1])
+        _, broadcast_below = _blocks_below(broadcast.astype(np.int64), player[0], player[2])
+
+    return BatchSummary(
+        caskets=caskets,
+        value_sum=float(values.sum()),
+        value_squares=float(np.square(values).sum()),
+        uniques=int(unique.sum()),
+        broadcasts=int(broadcast.sum()),
+        value_sketch=np.quantile(values, SKETCH_POINTS),
+        gap_count=len(gaps),
+        gap_sketch=np.quantile(gaps, SKETCH_POINTS) if len(gaps) else np.zeros(0),
+        first_gap=first_gap,
+        open_gap=open_gap,
+        blocks=blocks,
+        unique_blocks_below=unique_below,
+        broadcast_blocks_below=broadcast_below,
+    )
+
+
+def merge_sketches(
+    left: tuple[np.ndarray, int], right: tuple[np.ndarray, int]
+) -> tuple[np.ndarray, int]:
+    """Merges two quantile sketches at ``SKETCH_POINTS`` weighted by their sample counts.
+
+    The merged distribution function is the count-weighted mix of both
+    piecewise linear ones, sampled back at ``SKETCH_POINTS``.
+    """
+    (left_sketch, left_count), (right_sketch, right_count) = left, right
+    if not left_count or not len(left_sketch):
+        return right if right_count and len(right_sketch) else (np.zeros(0), 0)
+    if not right_count or not len(right_sketch):
+        return left
+    points = np.union1d(left_sketch, right_sketch)
+    cumulative = (
+        left_count * np.interp(points, left_sketch, SKETCH_POINTS)
+        + right_count * np.interp(points, right_sketch, SKETCH_POINTS)
+    ) / (left_count + right_count)
+    return np.interp(SKETCH_POINTS, cumulative, points), left_count + right_count
+
+
+def sketch_percentiles(sketch: np.ndarray, count: int) -> dict[str, float]:
+    if not count or not len(sketch):
+        return {}
+    return {
+        f"p{percentile}": round(float(np.interp(percentile / 100, SKETCH_POINTS, sketch)), 2)
+        for percentile in PERCENTILES
+    }
+
+
+class PlayerComparison(BaseModel):  # type: ignore
+    caskets: int
+    uniques: int
+    broadcasts: int
+    expected_uniques: float
+    expected_broadcasts: float
+    unique_percentile: Optional[float]
+    broadcast_percentile: Optional[float]
+
+
+class SimulationReport(BaseModel):  # type: ignore
+    tier: str
+    requested: int
+    caskets: int
+    finished: bool
+    mean_value: float
+    std_value: float
+    unique_rate: float
+    broadcast_rate: float
+    value_percentiles: dict[str, float]
+    caskets_to_unique_percentiles: dict[str, float]
+    player: Optional[PlayerComparison] = None
+
+
+class SimulationRun:
+    """Running merge of batch summaries into a report.
+
+    Batches are merged into running sums and sketches in batch order, so a
+    report costs the same after the first and the last batch and a seeded
+    run merges to the same result however its batches are scheduled.
+    """
+
+    def __init__(self, tier: str, requested: int, stats: Optional[Statistics]):
+        self.tier = tier
+        self.requested = requested
+        self.stats = stats
+        self.caskets = 0
+        self.value_sum = 0.0
+        self.value_squares = 0.0
+        self.uniques = 0
+        self.broadcasts = 0
+        self.value_sketch: tuple[np.ndarray, int] = (np.zeros(0), 0)
+        self.gap_sketch: tuple[np.ndarray, int] = (np.zeros(0), 0)
+        self.open_gap = 0
+        self.blocks = 0
+        self.unique_blocks_below = 0.0
+        self.broadcast_blocks_below = 0.0
+        self._pending: dict[int, BatchSummary] = {}
+        self._next_index = 0
+
+    def add(self, index: int, summary: BatchSummary) -> None:
+        self._pending[index] = summary
+        while self._next_index in self._pending:
+            self._merge(self._pending.pop(self._next_index))
+            self._next_index += 1
+
+    def _merge(self, summary: BatchSummary) -> None:
+        self.caskets += summary.caskets
+        self.value_sum += summary.value_sum
+        self.value_squares += summary.value_squares
+        self.uniques += summary.uniques
+        self.broadcasts += summary.broadcasts
+        self.value_sketch = merge_sketches(self.value_sketch, (summary.value_sketch, summary.caskets))
+        self.gap_sketch = merge_sketches(self.gap_sketch, (summary.gap_sketch, summary.gap_count))
+        if summary.first_gap is None:
+            self.open_gap += summary.open_gap
+        else:
+            joined = np.full(len(SKETCH_POINTS), float(self.open_gap + summary.first_gap))
+            self.gap_sketch = merge_sketches(self.gap_sketch, (joined, 1))
+            self.open_gap = summary.open_gap
+        self.blocks += summary.blocks
+        self.unique_blocks_below += summary.unique_blocks_below
+        self.broadcast_blocks_below += summary.broadcast_blocks_below
+
+    def report(self) -> SimulationReport:
+        caskets = self.caskets
+        mean = self.value_sum / caskets if caskets else 0.0
+        squares = self.value_squares / caskets if caskets else 0.0
+        unique_rate = self.uniques / caskets if caskets else 0.0
+        broadcast_rate = self.broadcasts / caskets if caskets else 0.0
+        return SimulationReport(
+            tier=self.tier,
+            requested=self.requested,
+            caskets=caskets,
+            finished=caskets >= self.requested,
+            mean_value=round(mean, 2),
+            std_value=round(max(squares - mean * mean, 0.0) ** 0.5, 2),
+            unique_rate=unique_rate,
+            broadcast_rate=broadcast_rate,
+            value_percentiles=sketch_percentiles(*self.value_sketch),
+            caskets_to_unique_percentiles=sketch_percentiles(*self.gap_sketch),
+            player=self._compare(unique_rate, broadcast_rate),
+        )
+
+    def _compare(self, unique_rate: float, broadcast_rate: float) -> Optional[PlayerComparison]:
+        if self.stats is None or self.stats.openend_caskets <= 0:
+            return None
+        return PlayerComparison(
+            caskets=self.stats.openend_caskets,
+            uniques=self.stats.uniques,
+            broadcasts=self.stats.broadcasts,
+            expected_uniques=round(unique_rate * self.stats.openend_caskets, 2),
+            expected_broadcasts=round(broadcast_rate * self.stats.openend_caskets, 2),
+            unique_percentile=(
+                round(self.unique_blocks_below / self.blocks, 4) if self.blocks else None
+            ),
+            broadcast_percentile=(
+                round(self.broadcast_blocks_below / self.blocks, 4) if self.blocks else None
+            ),
+        )
+
+
+class MonteCarloSimulator:
+    """Simulates casket openings in batches spread over a process pool.
+
+    Every batch draws from its own child of one ``SeedSequence``, so a seeded
+    run is reproducible regardless of how batches are scheduled. Reports are
+    yielded after each finished batch; closing the iterator cancels the
+    batches not yet started.
+    """
+
+    def __init__(self, workers: Optional[int] = None, batch_size: int = 50_000):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def run(
+        self,
+        items: Iterable[Item],
+        tier: str,
+        caskets: int,
+        seed: Optional[int] = None,
+        stats: Optional[Statistics] = None,
+    ) -> AsyncIterator[SimulationReport]:
+        """Returns the stream of reports, raises ``KeyError`` right away for an unknown tier."""
+        table = SimulationTable(tier, items)
+        if not len(table):
+            raise KeyError(tier)
+        return self._run(table, caskets, seed, stats)
+
+    async def _run(
+        self,
+        table: SimulationTable,
+        caskets: int,
+        seed: Optional[int],
+        stats: Optional[Statistics],
+    ) -> AsyncIterator[SimulationReport]:
+        sizes = [self.batch_size] * (caskets // self.batch_size)
+        if caskets % self.batch_size:
+            sizes.append(caskets % self.batch_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        player = (stats.openend_caskets, stats.uniques, stats.broadcasts) if stats else None
+        run = SimulationRun(table.tier, caskets, stats)
+
+        loop = asyncio.get_running_loop()
+        batches = iter(enumerate(zip(sizes, seeds)))
+        running: dict[asyncio.Future[BatchSummary], int] = {}
+        submitted: list[Future[BatchSummary]] = []
+
+        def submit_next() -> None:
+            for index, (size, child) in batches:
+                future = self.executor.submit(simulate_batch, table, child, size, player)
+                submitted.append(future)
+                running[asyncio.wrap_future(future, loop=loop)] = index
+                return
+
+        try:
+            for _ in range(2 * self.workers):
+                submit_next()
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    run.add(running.pop(finished), finished.result())
+                    submit_next()
+                yield run.report()
+        finally:
+            for future in submitted:
+                future.cancel()
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
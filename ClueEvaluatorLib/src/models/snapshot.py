@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+from typing import Any, TypeVar
+
+try:
+    from ClueEvaluatorLib.src.models.base import DBBaseModel
+    from ClueEvaluatorLib.src.models.util import FileReader
+except:  # noqa: E722
+    from base import DBBaseModel  # type: ignore[no-redef]
+    from util import FileReader  # type: ignore[no-redef]
+
+SNAPSHOT_VERSION = 3
+
+M = TypeVar("M", bound=DBBaseModel)
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reindex(index: dict[tuple[Any, ...], M], instances: list[M]) -> None:
+    index.clear()
+    index.update((instance.identity(), instance) for instance in instances)
+
+
+class CatalogSnapshot:
+    """Parsed catalog objects of a CSV file, pickled next to the database.
+
+    The file starts with a small header holding the snapshot version and the
+    SHA-256 of the source CSV, followed by the objects themselves. A snapshot
+    is only restored if both match, so editing the CSV or changing the models
+    (bump ``SNAPSHOT_VERSION``) falls back to a full parse. Unpickling skips
+    model validation, shared drop sources and quantities stay shared.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _header(self, source: str) -> dict[str, Any]:
+        return {"version": SNAPSHOT_VERSION, "source_hash": file_digest(source)}
+
+    def restore(self, reader: FileReader) -> bool:
+        """Fills ``reader`` from the snapshot, returns ``False`` if it is missing or stale."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "rb") as fp:
+                if pickle.load(fp) != self._header(reader.datafile):
+                    return False
+                data = pickle.load(fp)
+        except Exception as error:
+            print(f"Ignoring unreadable catalog snapshot: {error!r}")
+            return False
+
+        reader.dropsources = data["dropsources"]
+        reader.quantities = data["quantities"]
+        reader.modifiers = data["modifiers"]
+        reader.items = data["items"]
+        reader.progress = data["progress"]
+        reader.fingerprints = data["fingerprints"]
+        _reindex(reader.dropsource_index, reader.dropsources)
+        _reindex(reader.quantity_index, reader.quantities)
+        _reindex(reader.modifier_index, reader.modifiers)
+        _reindex(reader.item_index, reader.items)
+        print(f"Restored catalog snapshot: {reader.progress}")
+        return True
+
+    def save(self, reader: FileReader) -> None:
+        data: dict[str, Any] = {
+            "dropsources": reader.dropsources,
+            "quantities": reader.quantities,
+            "modifiers": reader.modifiers,
+            "items": reader.items,
+            "progress": reader.progress,
+            "fingerprints": reader.fingerprints,
+        }
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "wb") as fp:
+            pickle.dump(self._header(reader.datafile), fp, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.path)
+
+    async def load(self, reader: FileReader) -> bool:
+        """Fills ``reader`` from the snapshot or by parsing the CSV, returns whether it was parsed."""
+        if self.restore(reader):
+            return False
+        await reader._get_data()
+        self.save(reader)
+        return True
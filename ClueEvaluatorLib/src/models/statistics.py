@@ -3,72 +3,121 @@ from __future__ import annotations
 import pickle
 import re
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, Callable, ClassVar, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field, PrivateAttr
 
 try:
     from ClueEvaluatorLib.src.models.base import DBBaseModel
+    from ClueEvaluatorLib.src.models.rates import RateTracker, WindowRates
 except:  # noqa: E722
     from base import DBBaseModel  # type: ignore[no-redef]
+    from rates import RateTracker, WindowRates  # type: ignore[no-redef]
+
+# Window driving the displayed hourly rates, the session is used if it is not tracked.
+HOURLY_WINDOW = "1h"
 
 
 class InitParams(DBBaseModel):
+    identity_columns: ClassVar[tuple[str, ...]] = ("player_name",)
     player_name: str
     tier_4_luck: bool
     orlando: bool
     rebuild_db: bool = False
 
-    async def as_db_item(self, db_model: BaseModel) -> BaseModel:
-        return db_model(
-            player_name=self.player_name,
-            tier_4_luck=self.tier_4_luck,
-            orlando=self.orlando,
-            rebuild_db=self.rebuild_db,
-        )
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "player_name": self.player_name,
+            "tier_4_luck": self.tier_4_luck,
+            "orlando": self.orlando,
+            "rebuild_db": self.rebuild_db,
+        }
 
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        return f"SELECT * FROM initparams WHERE player_name == '{self.player_name}'"
+    def identity(self) -> tuple[Any, ...]:
+        return (self.player_name,)
 
 
 class Statistics(DBBaseModel):
+    identity_columns: ClassVar[tuple[str, ...]] = ("player_name",)
     player_name: str
     openend_caskets: int
     uniques: int
     broadcasts: int
+    total_value: int = 0
 
-    async def as_db_item(self, db_model: BaseModel) -> BaseModel:
-        return db_model(
-            player_name=self.player_name,
-            openend_caskets=self.openend_caskets,
-            uniques=self.uniques,
-            broadcasts=self.broadcasts,
-        )
+    def as_db_row(self) -> dict[str, Any]:
+        return {
+            "player_name": self.player_name,
+            "openend_caskets": self.openend_caskets,
+            "uniques": self.uniques,
+            "broadcasts": self.broadcasts,
+            "total_value": self.total_value,
+        }
 
     def serialize(self) -> bytes:
         return pickle.dumps(self)
 
-    def filter_statement(self) -> str:
-        return f"SELECT * FROM statistics WHERE player_name == '{self.player_name}'"
+    def identity(self) -> tuple[Any, ...]:
+        return (self.player_name,)
+
+    async def record(self, value: int, is_unique: bool, is_broadcast: bool) -> None:
+        self.openend_caskets += 1
+        self.uniques += int(is_unique)
+        self.broadcasts += int(is_broadcast)
+        self.total_value += value
 
     async def reset(self) -> None:
         self.openend_caskets = 0
         self.uniques = 0
         self.broadcasts = 0
+        self.total_value = 0
+
+
+class RewardItem(BaseModel):  # type: ignore
+    item_name: str
+    quantity: int = Field(default=1, gt=0)
+
+
+class CasketReward(BaseModel):  # type: ignore
+    items: list[RewardItem] = Field(min_length=1)
+
+
+class CasketResult(BaseModel):  # type: ignore
+    value: int
+    is_unique: bool
+    is_broadcast: bool
 
 
 class WealthEvaluator(BaseModel):  # type: ignore
+    """Rates of one player, ``total`` is the value opened since ``start_time``.
+
+    Lifetime counts and value live in ``stats`` and are persisted.
+    """
+
     start_time: Optional[datetime] = None
     total: int = 0
     stats: Statistics
+    _listeners: list[Callable[[], None]] = PrivateAttr(default_factory=list)
+    _rates: RateTracker = PrivateAttr(default_factory=RateTracker)
 
     def model_post_init(self, __context: Any) -> None:
         self.start_time = datetime.now()
         super().model_post_init(__context)
 
+    def add_listener(self, listener: Callable[[], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def changed(self) -> None:
+        for listener in self._listeners:
+            listener()
+
     async def formatted_gp_value(self, value: int) -> str:
         return re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1,", "%d" % value)
 
@@ -78,30 +127,58 @@ class WealthEvaluator(BaseModel):  # type: ignore
         else:
             return 0
 
+    async def hourly_window(self) -> WindowRates:
+        """Rates of the last hour, or of the whole session while it is shorter."""
+        rates = {window.window: window for window in self._rates.rates()}
+        return rates.get(HOURLY_WINDOW, rates["session"])
+
     async def hourly_rate(self) -> int:
-        if self.start_time:
-            endtime = datetime.now()
-            duration = (self.start_time - endtime).seconds
-            return int(self.total // (3600 / duration))
-        return 0
+        return (await self.hourly_window()).gp_per_hour
+
+    @property
+    def rate_tracker(self) -> RateTracker:
+        return self._rates
+
+    async def add_casket(self, result: CasketResult) -> None:
+        self.total += result.value
+        await self.stats.record(result.value, result.is_unique, result.is_broadcast)
+        self._rates.record(result.value, result.is_unique, result.is_broadcast)
+        self.changed()
 
     async def get_item_rates(self) -> dict[str, Any]:
         return {
             "unique_rate": f"{await self._make_rate(self.stats.uniques):.2%}",
             "broadcast_rate": f"{await self._make_rate(self.stats.broadcasts):.2%}",
+            "uniques_hourly": f"{(await self.hourly_window()).uniques_per_hour:.2f}",
         }
 
     async def get_money_rates(self) -> dict[str, Any]:
         return {
             "hourly": await self.formatted_gp_value(await self.hourly_rate()),
-            "total": await self.formatted_gp_value(self.total),
-            "average": await self.formatted_gp_value(int(await self._make_rate(self.total))),
+            "total": await self.formatted_gp_value(self.stats.total_value),
+            "average": await self.formatted_gp_value(int(await self._make_rate(self.stats.total_value))),
+        }
+
+    async def get_window_rates(self) -> list[WindowRates]:
+        return self._rates.rates()
+
+    async def get_windows(self) -> dict[str, Any]:
+        return {
+            rates.window: {
+                "opened": f"{rates.caskets}",
+                "hourly": await self.formatted_gp_value(rates.gp_per_hour),
+                "uniques_hourly": f"{rates.uniques_per_hour:.2f}",
+                "unique_rate": f"{rates.unique_rate:.2%}",
+                "broadcast_rate": f"{rates.broadcast_rate:.2%}",
+            }
+            for rates in await self.get_window_rates()
         }
 
     async def get_info(self) -> dict[str, Any]:
         return {
             "item_rates": await self.get_item_rates(),
             "money_rates": await self.get_money_rates(),
+            "windows": await self.get_windows(),
             "stats": {
                 "opened": f"{self.stats.openend_caskets}",
                 "uniques": f"{self.stats.uniques}",
@@ -113,3 +190,5 @@ class WealthEvaluator(BaseModel):  # type: ignore
         self.start_time = datetime.now()
         self.total = 0
         await self.stats.reset()
+        self._rates.reset()
+        self.changed()
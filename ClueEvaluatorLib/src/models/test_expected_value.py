@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import random
+from typing import Optional
+
+import numpy as np
+import pytest
+
+from ClueEvaluatorLib.src.models.expected_value import ExpectedValueEngine
+from ClueEvaluatorLib.src.models.items import DropSources, Item, ItemQuantity
+
+TIERS = ("easy", "medium", "hard", "elite")
+DROPTABLES = ("common", "rare", "mimic")
+
+
+def make_items(rng: random.Random, count: int) -> list[Item]:
+    items = []
+    for index in range(count):
+        minquantity = rng.randint(1, 20)
+        price: Optional[int] = rng.randint(1, 2_000_000) if rng.random() < 0.9 else None
+        items.append(
+            Item(
+                display_name=f"Item {index}",
+                itemquantity=ItemQuantity(
+                    minquantity=minquantity, maxquantity=minquantity + rng.randint(0, 50)
+                ),
+                is_unique=False,
+                is_broadcast=False,
+                noted=False,
+                dropsources=[
+                    DropSources(name=tier, rate=f"1/{rng.randint(1, 5000)}")
+                    for tier in rng.sample(TIERS, rng.randint(1, len(TIERS)))
+                ],
+                droptable=rng.choice(DROPTABLES),
+                price=price,
+                image_id=index,
+                category="misc",
+            ),
+        )
+    return items
+
+
+def assert_same_totals(engine: ExpectedValueEngine, expected: ExpectedValueEngine) -> None:
+    np.testing.assert_allclose(engine.mean, expected.mean, rtol=1e-9)
+    np.testing.assert_allclose(engine.variance, expected.variance, rtol=1e-9)
+    np.testing.assert_array_equal(engine.unpriced, expected.unpriced)
+    for actual, recomputed in zip(engine.expectations(), expected.expectations()):
+        assert actual.tier.model_dump(exclude={"mean", "variance", "std"}) == recomputed.tier.model_dump(
+            exclude={"mean", "variance", "std"}
+        )
+        assert actual.tier.mean == pytest.approx(recomputed.tier.mean)
+        assert actual.tier.std == pytest.approx(recomputed.tier.std)
+
+
+def test_update_prices_matches_full_recompute() -> None:
+    rng = random.Random(3)
+    items = make_items(rng, 400)
+    engine = ExpectedValueEngine(items)
+
+    for _ in range(5):
+        changed = rng.sample(items, 60)
+        for item in changed:
+            roll = rng.random()
+            item.price = None if roll < 0.15 else rng.randint(1, 5_000_000)
+        assert engine.update_prices(changed) <= len(changed)
+        assert_same_totals(engine, ExpectedValueEngine(items))
+
+
+def test_update_prices_skips_unchanged_and_unknown_items() -> None:
+    rng = random.Random(5)
+    items = make_items(rng, 50)
+    engine = ExpectedValueEngine(items)
+    stranger = make_items(random.Random(6), 1)[0]
+    stranger.display_name = "Not in the engine"
+
+    assert engine.update_prices([*items[:10], stranger]) == 0
+
+    items[0].price = (items[0].price or 0) + 1
+    assert engine.update_prices(items[:10]) == 1
+    assert_same_totals(engine, ExpectedValueEngine(items))
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import pathlib
+import sqlite3
+
+from ClueEvaluatorLib.src.fastapi_server import OBJECT_TYPES
+from ClueEvaluatorLib.src.models.dbhandler import DataBaseHandler
+from ClueEvaluatorLib.src.models.migrations import SCHEMA_VERSION, migrate_schema
+from ClueEvaluatorLib.src.models.statistics import Statistics
+
+
+def test_identity_migration_keeps_latest_duplicate(tmp_path: pathlib.Path) -> None:
+    db = tmp_path / "legacy.db"
+    with contextlib.closing(sqlite3.connect(db)) as connection, connection:
+        # Tables of an unversioned database, written without identity indexes.
+        connection.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, display_name VARCHAR)")
+        connection.execute(
+            "CREATE TABLE statistics (id INTEGER PRIMARY KEY, player_name VARCHAR NOT NULL, "
+            "openend_caskets INTEGER NOT NULL, uniques INTEGER NOT NULL, broadcasts INTEGER NOT NULL)"
+        )
+        connection.executemany(
+            "INSERT INTO statistics (player_name, openend_caskets, uniques, broadcasts) VALUES (?, ?, ?, ?)",
+            [("player", 3, 0, 0), ("other", 1, 1, 0), ("player", 7, 1, 1)],
+        )
+
+    async def run() -> None:
+        dbhandler = DataBaseHandler(dbfile=str(db), echo=False, db_object_types=OBJECT_TYPES)
+        try:
+            assert await migrate_schema(dbhandler, OBJECT_TYPES) == 0
+            assert await dbhandler.get_schema_version() == SCHEMA_VERSION
+            assert await dbhandler.get_player_stats("player") == Statistics(
+                player_name="player", openend_caskets=7, uniques=1, broadcasts=1, total_value=0
+            )
+
+            await dbhandler.save_player_stats(
+                [Statistics(player_name="player", openend_caskets=8, uniques=1, broadcasts=1)]
+            )
+            stats = await dbhandler.get_player_stats("player")
+            assert stats is not None and stats.openend_caskets == 8
+        finally:
+            await dbhandler.close()
+
+    asyncio.run(run())
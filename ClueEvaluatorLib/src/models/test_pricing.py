@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import asyncio
+import pathlib
+from typing import Optional
+
+import pytest
+
+from ClueEvaluatorLib.src.models.pricing import PriceCache, PriceFetcher, PriceFetchError
+
+
+class StubFetcher(PriceFetcher):
+    def __init__(self, prices: dict[str, Optional[int]]):
+        super().__init__()
+        self.prices = prices
+        self.failing: set[str] = set()
+        self.calls: list[str] = []
+
+    async def fetch_price(self, internal_name: str) -> Optional[int]:
+        self.calls.append(internal_name)
+        if internal_name in self.failing:
+            raise PriceFetchError(f"Giving up on price lookup for {internal_name}")
+        return self.prices.get(internal_name)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> Clock:
+    clock = Clock()
+    monkeypatch.setattr("ClueEvaluatorLib.src.models.pricing.time.time", clock)
+    return clock
+
+
+def open_cache(tmp_path: pathlib.Path, fetcher: StubFetcher) -> PriceCache:
+    return PriceCache.open_file(
+        str(tmp_path / "prices.db"),
+        fetcher=fetcher,
+        ttl=100.0,
+        negative_ttl=50.0,
+        retry_backoff=10.0,
+        max_retry_backoff=40.0,
+    )
+
+
+def test_stale_prices_are_served_and_refreshed(tmp_path: pathlib.Path, clock: Clock) -> None:
+    fetcher = StubFetcher({"Coins": 1, "Rune_platebody": 38_000})
+
+    async def run() -> None:
+        cache = open_cache(tmp_path, fetcher)
+        try:
+            assert await cache.get_prices(["Coins", "Rune_platebody"]) == {
+                "Coins": 1,
+                "Rune_platebody": 38_000,
+            }
+            clock.now += 99
+            assert await cache.get_price("Rune_platebody") == 38_000
+            assert await cache.refresh_stale() == 0
+            assert len(fetcher.calls) == 2
+
+            fetcher.prices["Rune_platebody"] = 40_000
+            clock.now += 2
+            # Expired entries are still served while they wait for the refresher.
+            assert await cache.get_price("Rune_platebody") == 38_000
+            assert await cache.refresh_stale() == 1
+            assert await cache.get_price("Rune_platebody") == 40_000
+            # Expired entries nobody asked for are found in the table.
+            assert await cache.refresh_stale() == 1
+            assert fetcher.calls[-1] == "Coins"
+        finally:
+            await cache.close()
+
+    asyncio.run(run())
+
+
+def test_missing_prices_are_remembered(tmp_path: pathlib.Path, clock: Clock) -> None:
+    fetcher = StubFetcher({})
+
+    async def run() -> None:
+        cache = open_cache(tmp_path, fetcher)
+        try:
+            assert await cache.get_price("Clue_scroll") is None
+            assert await cache.get_price("Clue_scroll") is None
+            assert fetcher.calls == ["Clue_scroll"]
+
+            clock.now += 51
+            fetcher.prices["Clue_scroll"] = 5
+            cache.hot.clear()
+            assert await cache.refresh_stale() == 1
+            assert await cache.get_price("Clue_scroll") == 5
+        finally:
+            await cache.close()
+
+    asyncio.run(run())
+
+
+def test_failed_refresh_keeps_price_and_backs_off(tmp_path: pathlib.Path, clock: Clock) -> None:
+    fetcher = StubFetcher({"Dragon_helm": 1234})
+
+    async def run() -> None:
+        cache = open_cache(tmp_path, fetcher)
+        try:
+            assert await cache.get_price("Dragon_helm") == 1234
+            fetcher.failing.add("Dragon_helm")
+            clock.now += 101
+            assert await cache.refresh_stale() == 0
+            cache.hot.clear()
+            assert await cache.get_price("Dragon_helm") == 1234
+            assert len(fetcher.calls) == 2
+
+            # Waits for the backoff, which doubles with every failure.
+            clock.now += 9
+            assert await cache.refresh_stale() == 0
+            assert len(fetcher.calls) == 2
+            clock.now += 1
+            assert await cache.refresh_stale() == 0
+            assert len(fetcher.calls) == 3
+            clock.now += 19
+            assert await cache.refresh_stale() == 0
+            assert len(fetcher.calls) == 3
+
+            fetcher.failing.clear()
+            fetcher.prices["Dragon_helm"] = 1500
+            clock.now += 1
+            assert await cache.refresh_stale() == 1
+            assert await cache.get_price("Dragon_helm") == 1500
+        finally:
+            await cache.close()
+
+    asyncio.run(run())
+
+
+def test_failed_lookup_is_not_cached(tmp_path: pathlib.Path, clock: Clock) -> None:
+    fetcher = StubFetcher({"Dragon_helm": 1234})
+    fetcher.failing.add("Dragon_helm")
+
+    async def run() -> None:
+        cache = open_cache(tmp_path, fetcher)
+        try:
+            assert await cache.get_price("Dragon_helm") is None
+            fetcher.failing.clear()
+            assert await cache.get_price("Dragon_helm") == 1234
+            assert len(fetcher.calls) == 2
+        finally:
+            await cache.close()
+
+    asyncio.run(run())
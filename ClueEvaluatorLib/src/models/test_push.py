@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+
+from ClueEvaluatorLib.src.models.push import EvaluatorUpdates
+from ClueEvaluatorLib.src.models.statistics import CasketResult, Statistics, WealthEvaluator
+
+
+def make_evaluator() -> WealthEvaluator:
+    return WealthEvaluator(
+        stats=Statistics(player_name="player", openend_caskets=0, uniques=0, broadcasts=0)
+    )
+
+
+def test_idle_subscribers_receive_decaying_rates() -> None:
+    async def run() -> None:
+        evaluator = make_evaluator()
+        updates = EvaluatorUpdates(evaluator, debounce=0.01, max_delay=0.05)
+        await updates.start()
+        try:
+            await evaluator.add_casket(
+                CasketResult(value=3_600_000, is_unique=False, is_broadcast=False)
+            )
+            # Lets the update of the casket itself go out before subscribing.
+            await asyncio.sleep(0.1)
+            async with updates.subscribe() as queue:
+                first = await asyncio.wait_for(queue.get(), timeout=1)
+                assert first is not None
+
+                # No casket is opened, only time passes.
+                evaluator.rate_tracker.started -= 1800
+                later = await asyncio.wait_for(queue.get(), timeout=1)
+                assert later is not None
+                assert later["money_rates"]["hourly"] != first["money_rates"]["hourly"]
+        finally:
+            await updates.stop()
+
+    asyncio.run(run())
+
+
+def test_unchanged_snapshots_are_not_sent() -> None:
+    async def run() -> None:
+        evaluator = make_evaluator()
+        updates = EvaluatorUpdates(evaluator, debounce=0.01, max_delay=0.02)
+        await updates.start()
+        try:
+            async with updates.subscribe() as queue:
+                await asyncio.wait_for(queue.get(), timeout=1)
+                await asyncio.sleep(0.1)
+                assert queue.empty()
+
+                await evaluator.add_casket(CasketResult(value=100, is_unique=True, is_broadcast=False))
+                snapshot = await asyncio.wait_for(queue.get(), timeout=1)
+                assert snapshot is not None and snapshot["stats"]["opened"] == "1"
+        finally:
+            await updates.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+import random
+
+from ClueEvaluatorLib.src.models.rates import RateTracker
+from ClueEvaluatorLib.src.models.statistics import CasketResult, Statistics, WealthEvaluator
+
+
+def window_sums(
+    events: list[tuple[float, int, bool, bool]], now: float, duration: float
+) -> tuple[int, ...]:
+    kept = [event for event in events if event[0] > now - duration]
+    return (
+        len(kept),
+        sum(value for _, value, _, _ in kept),
+        sum(unique for _, _, unique, _ in kept),
+        sum(broadcast for _, _, _, broadcast in kept),
+    )
+
+
+def test_windows_match_recount() -> None:
+    rng = random.Random(7)
+    tracker = RateTracker(windows={"1m": 60.0, "5m": 300.0}, capacity=1024, clock=lambda: 0.0)
+    events: list[tuple[float, int, bool, bool]] = []
+    now = 0.0
+    for _ in range(800):
+        now += rng.expovariate(1 / 2.5)
+        event = (now, rng.randint(0, 500_000), rng.random() < 0.1, rng.random() < 0.02)
+        tracker.record(event[1], event[2], event[3], timestamp=now)
+        events.append(event)
+
+        if rng.random() < 0.2:
+            report = {rates.window: rates for rates in tracker.rates(now)}
+            for name, duration in (("1m", 60.0), ("5m", 300.0)):
+                rates = report[name]
+                assert (rates.caskets, rates.value, rates.uniques, rates.broadcasts) == window_sums(
+                    events, now, duration
+                )
+                assert rates.complete
+            assert report["session"].caskets == len(events)
+
+
+def test_rates_per_hour() -> None:
+    tracker = RateTracker(windows={"10m": 600.0}, clock=lambda: 0.0)
+    for second in range(0, 1200, 60):
+        tracker.record(1_000, second % 300 == 0, False, timestamp=float(second))
+
+    window, session = tracker.rates(1200.0)
+    # Events at 660..1140 are inside the last 600 seconds, the one at 900 is unique.
+    assert (window.caskets, window.value, window.uniques) == (9, 9_000, 1)
+    assert window.gp_per_hour == 54_000
+    assert window.caskets_per_hour == 54.0
+    assert window.unique_rate == 1 / 9
+    assert (session.caskets, session.gp_per_hour) == (20, 60_000)
+
+
+def test_window_expires_without_new_events() -> None:
+    tracker = RateTracker(windows={"1m": 60.0}, clock=lambda: 0.0)
+    tracker.record(500, True, True, timestamp=10.0)
+
+    assert tracker.rates(70.0)[0].caskets == 0
+    assert tracker.rates(70.0)[1].caskets == 1
+
+
+def test_overwritten_events_mark_window_incomplete() -> None:
+    tracker = RateTracker(windows={"1m": 60.0}, capacity=4, clock=lambda: 0.0)
+    for second in range(6):
+        tracker.record(100, False, False, timestamp=float(second))
+
+    window = tracker.rates(6.0)[0]
+    assert (window.caskets, window.value) == (4, 400)
+    assert not window.complete
+    # Complete again once the overwritten events would have left the window.
+    assert tracker.rates(61.5)[0].complete
+
+
+def test_evaluator_hourly_rates_follow_the_last_hour() -> None:
+    now = [0.0]
+    evaluator = WealthEvaluator(
+        stats=Statistics(player_name="player", openend_caskets=0, uniques=0, broadcasts=0)
+    )
+    evaluator._rates = RateTracker(clock=lambda: now[0])
+
+    async def run() -> None:
+        await evaluator.add_casket(CasketResult(value=1_000_000, is_unique=True, is_broadcast=False))
+        now[0] = 1800.0
+        assert await evaluator.hourly_rate() == 2_000_000
+
+        now[0] = 4000.0
+        await evaluator.add_casket(CasketResult(value=300, is_unique=False, is_broadcast=False))
+        # The first casket left the last hour, the lifetime statistics keep it.
+        assert await evaluator.hourly_rate() == 300
+        info = await evaluator.get_info()
+        assert info["money_rates"]["hourly"] == "300"
+        assert info["item_rates"]["uniques_hourly"] == "0.00"
+        assert info["money_rates"]["total"] == "1,000,300"
+        assert info["windows"]["1h"]["hourly"] == "300"
+
+    asyncio.run(run())
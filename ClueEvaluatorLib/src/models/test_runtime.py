@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import pathlib
+import random
+import sqlite3
+from typing import Any, Optional
+
+import httpx
+import pytest
+
+from ClueEvaluatorLib.src import fastapi_server
+from ClueEvaluatorLib.src.fastapi_server import OBJECT_TYPES
+from ClueEvaluatorLib.src.models.migrations import migrate_schema
+from ClueEvaluatorLib.src.models.pricing import PriceFetcher
+from ClueEvaluatorLib.src.models.runtime import Runtime
+from ClueEvaluatorLib.src.models.simulation import MonteCarloSimulator
+from ClueEvaluatorLib.src.models.statistics import CasketReward, InitParams, RewardItem
+
+HEADER = (
+    "display_name,quantity,is_unique,noted,is_broadcast,sources,table,price,modifiers,image_id,category"
+)
+TIERS = ("easy", "medium", "hard", "elite")
+
+
+class OfflineFetcher(PriceFetcher):
+    async def fetch_price(self, internal_name: str) -> Optional[int]:
+        return None
+
+
+def make_rows(rng: random.Random, count: int) -> list[str]:
+    rows = []
+    for index in range(count):
+        minquantity = rng.randint(1, 10)
+        sources = "-".join(
+            f"{tier}@1/{rng.randint(2, 2500)}" for tier in rng.sample(TIERS, rng.randint(1, len(TIERS)))
+        )
+        modifiers = (
+            f'"quantity={minquantity * 2}-{minquantity * 4},sources=elite@1/{rng.randint(2, 99)}"'
+            if rng.random() < 0.2
+            else "none"
+        )
+        price = str(rng.randint(1, 2_000_000)) if rng.random() < 0.9 else "None"
+        rows.append(
+            f"Item {index},{minquantity}-{minquantity + rng.randint(0, 20)},"
+            f"{index % 17 == 0},False,{index % 23 == 0},{sources},rare,{price},"
+            f"{modifiers},{1000 + index},misc"
+        )
+    return rows
+
+
+def edit_row(row: str, **fields: str) -> str:
+    values = next(csv.reader([row]))
+    columns = HEADER.split(",")
+    for column, value in fields.items():
+        values[columns.index(column)] = value
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
+
+
+def write_csv(path: pathlib.Path, rows: list[str]) -> None:
+    path.write_text("\n".join([HEADER, *rows]) + "\n")
+
+
+async def open_runtime(datafile: pathlib.Path, db: pathlib.Path, rebuild: bool = True) -> Runtime:
+    runtime = Runtime(
+        csv_filepath=str(datafile),
+        db_filepath=str(db),
+        db_object_types=OBJECT_TYPES,
+        db_echo=False,
+        price_fetcher=OfflineFetcher(),
+    )
+    await migrate_schema(runtime.dbhandler, OBJECT_TYPES)
+    await runtime.load_data()
+    if rebuild:
+        await runtime.build_database()
+    await runtime.build_catalog()
+    return runtime
+
+
+def test_unknown_item_rejects_whole_batch(tmp_path: pathlib.Path) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        try:
+            session = await runtime.open_session(
+                InitParams(player_name="player", tier_4_luck=False, orlando=False)
+            )
+            known = CasketReward(items=[RewardItem(item_name="Item 0", quantity=2)])
+            unknown = CasketReward(
+                items=[RewardItem(item_name="Item 1"), RewardItem(item_name="Not an item")]
+            )
+
+            with pytest.raises(KeyError):
+                await runtime.record_rewards(session, [known, unknown])
+            assert session.stats.openend_caskets == 0
+            assert session.stats.uniques == 0
+            assert session.evaluator.total == 0
+
+            item = runtime.catalog.get("Item 0")
+            assert item is not None
+            results = await runtime.record_rewards(session, [known])
+            assert results[0].is_unique
+            assert results[0].value == 2 * (item.price or 0)
+            assert session.stats.openend_caskets == 1
+            assert session.evaluator.total == results[0].value
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
+
+
+def test_lifetime_value_survives_reopening(tmp_path: pathlib.Path) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+    settings = InitParams(player_name="player", tier_4_luck=False, orlando=False)
+    rewards = [
+        CasketReward(items=[RewardItem(item_name="Item 2", quantity=3)]),
+        CasketReward(items=[RewardItem(item_name="Item 5")]),
+    ]
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        try:
+            results = await runtime.record_rewards(await runtime.open_session(settings), rewards)
+        finally:
+            await runtime.close()
+        total = sum(result.value for result in results)
+        assert total > 0
+
+        reopened = await open_runtime(datafile, tmp_path / "items.db", rebuild=False)
+        try:
+            session = await reopened.open_session(settings)
+            assert (session.stats.openend_caskets, session.stats.total_value) == (2, total)
+            money_rates = await session.evaluator.get_money_rates()
+            assert money_rates["total"] == await session.evaluator.formatted_gp_value(total)
+            assert money_rates["average"] == await session.evaluator.formatted_gp_value(total // 2)
+        finally:
+            await reopened.close()
+
+    asyncio.run(run())
+
+
+def api_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=fastapi_server.app), base_url="http://testserver"
+    )
+
+
+@pytest.mark.parametrize(
+    "rewards",
+    [
+        {"items": [{"item_name": "Item 0", "quantity": -5}]},
+        {"items": [{"item_name": "Item 0", "quantity": 0}]},
+        {"items": []},
+        [{"items": [{"item_name": "Item 0"}]}, {"items": []}],
+    ],
+)
+def test_invalid_rewards_are_rejected(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch, rewards: Any
+) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        monkeypatch.setattr(fastapi_server, "RUNTIME", runtime, raising=False)
+        try:
+            session = await runtime.open_session(
+                InitParams(player_name="player", tier_4_luck=False, orlando=False)
+            )
+            async with api_client() as client:
+                response = await client.post("/rewards/", params={"player_name": "player"}, json=rewards)
+                assert response.status_code == 422
+                assert session.stats.openend_caskets == 0
+                assert session.evaluator.total == 0
+
+                response = await client.post(
+                    "/rewards/",
+                    params={"player_name": "player"},
+                    json={"items": [{"item_name": "Item 0", "quantity": 2}]},
+                )
+                assert response.status_code == 200
+                assert session.stats.openend_caskets == 1
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
+
+
+def test_simulation_errors_before_streaming(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        runtime.simulator = MonteCarloSimulator(workers=1, batch_size=500)
+        monkeypatch.setattr(fastapi_server, "RUNTIME", runtime, raising=False)
+        try:
+            await runtime.open_session(
+                InitParams(player_name="player", tier_4_luck=False, orlando=False)
+            )
+            async with api_client() as client:
+                response = await client.get("/simulation/", params={"tier": "master"})
+                assert response.status_code == 404
+                response = await client.get(
+                    "/simulation/", params={"tier": "easy", "player_name": "stranger"}
+                )
+                assert response.status_code == 404
+
+                response = await client.get(
+                    "/simulation/",
+                    params={"tier": "easy", "caskets": 1000, "seed": 1, "player_name": "player"},
+                )
+                assert response.status_code == 200
+                reports = [json.loads(line) for line in response.text.splitlines()]
+                assert reports[-1]["caskets"] == 1000
+                assert reports[-1]["finished"]
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
+
+
+def test_price_change_invalidates_cached_items(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        monkeypatch.setattr(fastapi_server, "RUNTIME", runtime, raising=False)
+        item = runtime.catalog.get("Item 4")
+        assert item is not None
+        try:
+            async with api_client() as client:
+                etags = {}
+                for path, params in (("/items/", {"item_name": "Item 4"}), ("/python/items", {})):
+                    response = await client.get(path, params=params)
+                    assert response.status_code == 200
+                    etags[path] = response.headers["etag"]
+                    response = await client.get(
+                        path, params=params, headers={"If-None-Match": etags[path]}
+                    )
+                    assert response.status_code == 304
+
+                await runtime.price_cache.store({str(item.internal_name): (item.price or 0) + 1})
+
+                for path, params in (("/items/", {"item_name": "Item 4"}), ("/python/items", {})):
+                    response = await client.get(
+                        path, params=params, headers={"If-None-Match": etags[path]}
+                    )
+                    assert response.status_code == 200
+                    assert response.headers["etag"] != etags[path]
+                response = await client.get("/items/", params={"item_name": "Item 4"})
+                assert response.json()["price"] == item.price
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
+
+
+def test_recorded_rewards_invalidate_cached_statistics(
+    tmp_path: pathlib.Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    datafile = tmp_path / "items.csv"
+    write_csv(datafile, make_rows(random.Random(1), 20))
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "items.db")
+        monkeypatch.setattr(fastapi_server, "RUNTIME", runtime, raising=False)
+        try:
+            session = await runtime.open_session(
+                InitParams(player_name="player", tier_4_luck=False, orlando=False)
+            )
+            async with api_client() as client:
+                params = {"player_name": "player"}
+                response = await client.get("/player/statistics", params=params)
+                etag = response.headers["etag"]
+                assert response.json()["openend_caskets"] == 0
+
+                await runtime.record_rewards(
+                    session, [CasketReward(items=[RewardItem(item_name="Item 0")])]
+                )
+                response = await client.get(
+                    "/player/statistics", params=params, headers={"If-None-Match": etag}
+                )
+                assert response.status_code == 200
+                assert response.json()["openend_caskets"] == 1
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
+
+
+CATALOG_TABLES = ("item", "itemdropsource", "dropsources", "itemquantity", "itemmodifiers", "catalogrow")
+
+
+def dump_catalog_tables(db: pathlib.Path) -> dict[str, list[tuple[object, ...]]]:
+    tables = {}
+    with contextlib.closing(sqlite3.connect(db)) as connection:
+        for table in CATALOG_TABLES:
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+            selected = ", ".join(column for column in columns if column != "id")
+            tables[table] = sorted(
+                connection.execute(f"SELECT {selected} FROM {table}").fetchall(), key=repr
+            )
+    return tables
+
+
+def test_sync_matches_fresh_rebuild(tmp_path: pathlib.Path) -> None:
+    rng = random.Random(11)
+    datafile = tmp_path / "items.csv"
+    rows = make_rows(rng, 300)
+    write_csv(datafile, rows)
+
+    async def run() -> None:
+        runtime = await open_runtime(datafile, tmp_path / "synced.db")
+        try:
+            assert (await runtime.sync_catalog()).unchanged == len(rows)
+
+            # Price change, source change, removed rows and a new row.
+            rows[3] = edit_row(rows[3], price="777")
+            rows[7] = edit_row(rows[7], sources="hard@1/3-master@1/9")
+            del rows[100:140]
+            rows.append(
+                'Brand new thing,1-1,True,False,True,master@1/7,rare,42,"quantity=9-9,sources=master@1/3",5,misc'
+            )
+            write_csv(datafile, rows)
+
+            result = await runtime.sync_catalog()
+            assert result.removed == 40
+            assert result.added == 1
+            assert result.updated >= 2
+
+            fresh = await open_runtime(datafile, tmp_path / "fresh.db")
+            try:
+                assert dump_catalog_tables(tmp_path / "synced.db") == dump_catalog_tables(
+                    tmp_path / "fresh.db"
+                )
+                assert sorted(item.display_name for item in runtime.catalog.items) == sorted(
+                    item.display_name for item in fresh.catalog.items
+                )
+                synced_item = runtime.catalog.get("Item 7")
+                fresh_item = fresh.catalog.get("Item 7")
+                assert synced_item is not None and fresh_item is not None
+                assert synced_item.model_dump() == fresh_item.model_dump()
+            finally:
+                await fresh.close()
+        finally:
+            await runtime.close()
+
+    asyncio.run(run())
@@ -1,15 +1,18 @@
 from __future__ import annotations
 
-from typing import Any
+from typing import Any, AsyncIterator, Iterable, Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 try:
     import ClueEvaluatorLib.src.models.items as ItemModels
+    from ClueEvaluatorLib.src.models.base import DBBaseModel
 except:  # noqa: E722
     import items as ItemModels  # type: ignore[no-redef]
+    from base import DBBaseModel  # type: ignore[no-redef]
 
 import csv
+import hashlib
 
 
 def str2bool(v: str) -> bool:
@@ -20,32 +23,70 @@ def str2bool(v: str) -> bool:
     raise ValueError("Unknown string to convert to boolan value")
 
 
+def row_fingerprint(row: dict[str, Any]) -> str:
+    return hashlib.blake2b(
+        "\x1f".join(f"{name}={value}" for name, value in row.items()).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+class IngestProgress(BaseModel):  # type: ignore
+    rows: int = 0
+    dropsources: int = 0
+    quantities: int = 0
+    modifiers: int = 0
+    items: int = 0
+    duplicates: int = 0
+
+    def __str__(self) -> str:
+        return (
+            f"rows={self.rows} dropsources={self.dropsources} quantities={self.quantities} "
+            f"modifiers={self.modifiers} items={self.items} duplicates={self.duplicates}"
+        )
+
+
+class CatalogSyncResult(BaseModel):  # type: ignore
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+
+
 class FileReader(BaseModel):  # type: ignore
     datafile: str
+    progress_interval: int = 1000
+    progress: IngestProgress = Field(default_factory=IngestProgress)
     dropsources: list[ItemModels.DropSources] = []
     quantities: list[ItemModels.ItemQuantity] = []
     modifiers: list[ItemModels.ItemModifiers] = []
     items: list[ItemModels.Item] = []
+    dropsource_index: dict[tuple[Any, ...], ItemModels.DropSources] = {}
+    quantity_index: dict[tuple[Any, ...], ItemModels.ItemQuantity] = {}
+    modifier_index: dict[tuple[Any, ...], ItemModels.ItemModifiers] = {}
+    item_index: dict[tuple[Any, ...], ItemModels.Item] = {}
+    fingerprints: dict[str, str] = {}
+
+    def _index(self, index: dict[tuple[Any, ...], Any], instance: Any) -> tuple[Any, bool]:
+        key = instance.identity()
+        known = index.get(key)
+        if known is not None:
+            return known, False
+        index[key] = instance
+        return instance, True
 
     async def _make_dropsources(self, data: str) -> list[ItemModels.DropSources]:
-        instances = []
+        instances: dict[tuple[Any, ...], ItemModels.DropSources] = {}
 
         for instance in data.split("-"):
             parts = instance.split("@")
-            new_instance = ItemModels.DropSources(
-                name=str(parts[0]),
-                rate=str(parts[1]),
-            )
-            if new_instance not in instances:
-                instances.append(new_instance)
+            new_instance = ItemModels.DropSources.intern(str(parts[0]), str(parts[1]))
+            instances.setdefault(new_instance.identity(), new_instance)
 
-        return instances
+        return list(instances.values())
 
     async def _make_quantity(self, data: str) -> ItemModels.ItemQuantity:
-        return ItemModels.ItemQuantity(
-            minquantity=int(data.split("-")[0]),
-            maxquantity=int(data.split("-")[1]),
-        )
+        minquantity, maxquantity = data.split("-")[:2]
+        return ItemModels.ItemQuantity.intern(int(minquantity), int(maxquantity))
 
     async def _make_modifiers(self, data: str) -> ItemModels.ItemModifiers:
         parts = data.split(",")
@@ -67,19 +108,30 @@ class FileReader(BaseModel):  # type: ignore
             .capitalize()
         )
 
-    async def _make_objects(self, data: dict[str, Any]) -> None:
-        object_sources: list[ItemModels.DropSources] = await self._make_dropsources(data["sources"])
-        [self.dropsources.append(source) for source in object_sources if source not in self.dropsources]  # type: ignore[func-returns-value]
+    async def _make_objects(self, data: dict[str, Any]) -> AsyncIterator[DBBaseModel]:
+        object_sources: list[ItemModels.DropSources] = []
+        for source in await self._make_dropsources(data["sources"]):
+            source, is_new = self._index(self.dropsource_index, source)
+            object_sources.append(source)
+            if is_new:
+                self.progress.dropsources += 1
+                yield source
 
         object_quantitiy: ItemModels.ItemQuantity = await self._make_quantity(data["quantity"])
-        if object_quantitiy not in self.quantities:
-            self.quantities.append(object_quantitiy)
+        object_quantitiy, is_new = self._index(self.quantity_index, object_quantitiy)
+        if is_new:
+            self.progress.quantities += 1
+            yield object_quantitiy
 
-        object_modifiers: ItemModels.ItemModifiers
+        object_modifiers: Optional[ItemModels.ItemModifiers] = None
         if not data["modifiers"] == "none":
-            object_modifiers = await self._make_modifiers(data["modifiers"])
-            if object_modifiers not in self.modifiers:
-                self.modifiers.append(object_modifiers)
+            object_modifiers, is_new = self._index(
+                self.modifier_index,
+                await self._make_modifiers(data["modifiers"]),
+            )
+            if is_new:
+                self.progress.modifiers += 1
+                yield object_modifiers
 
         item: ItemModels.Item = ItemModels.Item(
             display_name=data["display_name"],
@@ -95,16 +147,65 @@ class FileReader(BaseModel):  # type: ignore
             category=data["category"],
         )
 
-        if item not in self.items:
-            self.items.append(item)
+        item, is_new = self._index(self.item_index, item)
+        if is_new:
+            self.progress.items += 1
+            yield item
+        else:
+            self.progress.duplicates += 1
 
-    async def _get_data(self) -> None:
+    async def stream_objects(self) -> AsyncIterator[DBBaseModel]:
+        """Yields every unique object of the CSV file as soon as it is parsed.
 
+        Duplicates are resolved through the identity indexes, progress is
+        reported every ``progress_interval`` rows.
+        """
         with open(self.datafile, newline="") as csvfile:
             reader = csv.DictReader(csvfile, delimiter=",", quotechar='"')
-            for row in enumerate(reader):
-                print(f"Processing row {row[0]}")
-                await self._make_objects(row[1])
+            for row in reader:
+                async for instance in self._make_objects(row):
+                    yield instance
+                self.fingerprints.setdefault(row["display_name"], row_fingerprint(row))
+                self.progress.rows += 1
+                if self.progress.rows % self.progress_interval == 0:
+                    print(f"Processing rows: {self.progress}")
+        print(f"Finished processing: {self.progress}")
+
+    def _targets(self) -> dict[type[DBBaseModel], list[Any]]:
+        return {
+            ItemModels.DropSources: self.dropsources,
+            ItemModels.ItemQuantity: self.quantities,
+            ItemModels.ItemModifiers: self.modifiers,
+            ItemModels.Item: self.items,
+        }
+
+    async def _get_data(self) -> None:
+        targets = self._targets()
+        async for instance in self.stream_objects():
+            targets[type(instance)].append(instance)
+
+    def read_fingerprints(self) -> dict[str, tuple[str, dict[str, Any]]]:
+        """Unparsed rows and their fingerprints by display name, the first row of a name wins."""
+        rows: dict[str, tuple[str, dict[str, Any]]] = {}
+        with open(self.datafile, newline="") as csvfile:
+            for row in csv.DictReader(csvfile, delimiter=",", quotechar='"'):
+                if row["display_name"] not in rows:
+                    rows[row["display_name"]] = (row_fingerprint(row), row)
+        return rows
+
+    async def parse_rows(self, rows: Iterable[dict[str, Any]]) -> None:
+        targets = self._targets()
+        for row in rows:
+            async for instance in self._make_objects(row):
+                targets[type(instance)].append(instance)
+            self.fingerprints.setdefault(row["display_name"], row_fingerprint(row))
+            self.progress.rows += 1
+
+    def catalog_rows(self) -> list[ItemModels.CatalogRow]:
+        return [
+            ItemModels.CatalogRow(display_name=name, fingerprint=fingerprint)
+            for name, fingerprint in self.fingerprints.items()
+        ]
 
 
 if __name__ == "__main__":